@@ -6,11 +6,15 @@ from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from config import Config
 from celery_util import celery_init_app
+from util.uploads import UploadRequest
 
 app = Flask(__name__)
 app.config.from_object(Config)
+# Uploaded files are streamed to disk while they are hashed
+app.request_class = UploadRequest
 
-CORS(app)
+# The cursor of the next page of the list endpoints is sent in a header
+CORS(app, expose_headers=["X-Next-Cursor"])
 
 celery_app = celery_init_app(app)
 celery_app.autodiscover_tasks()
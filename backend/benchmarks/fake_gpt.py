@@ -0,0 +1,125 @@
+import re
+import time
+import random
+from threading import Lock
+from types import SimpleNamespace
+from typing import Optional, Type
+import httpx
+import openai
+from util.quizgpt.index import Answer, Exam, Question, SegmentQuestion
+
+
+class FakeGPT:
+    """
+    Deterministic stand-in for the GPT API. Every request sleeps for `latency` seconds (plus up to
+    `latency_jitter` seconds), a `failure_rate` share of the questions are unsuccessful and an
+    `error_rate` share of the requests fail with a retryable server error.
+
+    The same seed always produces the same questions, failures and errors, as long as the
+    requests are made in the same order.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def _request(self) -> random.Random:
+        """
+        Simulates a request's latency and errors, returns the random generator of the request
+        """
+        with self._lock:
+            self.requests += 1
+            request_random = random.Random(self._random.random())
+
+        time.sleep(self.latency + request_random.uniform(0, self.latency_jitter))
+
+        if request_random.random() < self.error_rate:
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            raise openai.InternalServerError(
+                "Injected server error",
+                response=httpx.Response(500, request=request),
+                body=None,
+            )
+
+        return request_random
+
+    def question(self, request_random: random.Random) -> dict:
+        if request_random.random() < self.failure_rate:
+            return dict(
+                title="",
+                answers=[],
+                language="english",
+                success=False,
+                message="The question could not be generated. Injected failure.",
+            )
+
+        # Random words, so the questions are never near duplicates of each other
+        words = " ".join(f"w{request_random.randrange(10**6)}" for _ in range(8))
+        return dict(
+            title=f"Which of the following is {words}?",
+            answers=[
+                Answer(title=f"Answer {i} {words}", is_correct=i == 0)
+                for i in range(4)
+            ],
+            language="english",
+            success=True,
+            message="",
+        )
+
+
+class FakeStructuredOutput:
+    def __init__(self, gpt: FakeGPT, schema: Type) -> None:
+        self.gpt = gpt
+        self.schema = schema
+
+    def invoke(self, prompt: str):
+        request_random = self.gpt._request()
+
+        if self.schema is Exam:
+            segments = sorted(set(int(n) for n in re.findall(r"Segment (\d+):", prompt)))
+            return Exam(
+                questions=[
+                    SegmentQuestion(segment=n, **self.gpt.question(request_random))
+                    for n in segments
+                ],
+                language="english",
+            )
+
+        return Question(**self.gpt.question(request_random))
+
+
+class FakeGPTClients:
+    """
+    Drop-in replacement of `GPTClients` whose requests are answered by a `FakeGPT`
+    """
+
+    def __init__(self, gpt: Optional[FakeGPT] = None) -> None:
+        self.gpt = gpt or FakeGPT()
+        self.openai = SimpleNamespace(
+            chat=SimpleNamespace(
+                completions=SimpleNamespace(create=self._create_completion)
+            )
+        )
+
+    def _create_completion(self, **kwargs):
+        self.gpt._request()
+        message = SimpleNamespace(content="english")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def structured_output(self, model: str, schema: Type) -> FakeStructuredOutput:
+        return FakeStructuredOutput(self.gpt, schema)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,175 @@
+"""
+Benchmark of the list endpoints: the number of SQL statements and the time each request takes
+for accounts of growing sizes. The number of statements of a request must not grow with the
+number of rows it returns, the benchmark exits with an error if it does. Runs against the
+database of `DATABASE_URL`, the rows it creates are deleted once it is done.
+
+Usage (from the backend folder):
+    python -m benchmarks.list_queries --quizzes 10 300 --output list_queries.json
+"""
+
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import statistics
+from datetime import datetime, timezone
+from typing import List
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import app, db
+from models import Answer, Question, Quiz, Subject, User
+from util.importing import insert_questions
+
+ENDPOINTS = [
+    "/api/quizzing/subjects",
+    "/api/quizzing/quizzes",
+    "/api/quizzing/quizzes?limit=20",
+    "/api/quizzing/quizzes?limit=20&fields=id,title",
+]
+SUBJECTS = 5
+ANSWERS_PER_QUESTION = 4
+
+
+def seed_account(name: str, num_quizzes: int, num_questions: int) -> int:
+    """
+    Creates a user with `num_quizzes` quizzes of `num_questions` questions, spread over a few
+    subjects. Returns the user's id.
+    """
+    user = User(name=name, username=name, email=f"{name}@example.com", password="")
+    db.session.add(user)
+    db.session.flush()
+    subjects = [
+        Subject(title=f"{name} subject {i + 1}", created_by_id=user.id)
+        for i in range(SUBJECTS)
+    ]
+    db.session.add_all(subjects)
+    db.session.flush()
+
+    for i in range(num_quizzes):
+        quiz = Quiz(
+            title=f"{name} quiz {i + 1}",
+            description="Created by the benchmark",
+            success_percentage=50,
+            duration=10,
+            created_by_id=user.id,
+            subject_id=subjects[i % len(subjects)].id,
+        )
+        db.session.add(quiz)
+        db.session.flush()
+        insert_questions(
+            quiz.id,
+            [
+                {
+                    "title": f"Question {j + 1}?",
+                    "position": j,
+                    "answers": [
+                        {"title": f"Answer {k + 1}", "is_correct": k == 0}
+                        for k in range(ANSWERS_PER_QUESTION)
+                    ],
+                }
+                for j in range(num_questions)
+            ],
+        )
+    db.session.commit()
+    return user.id
+
+
+def delete_account(user_id: int) -> None:
+    quizzes = db.select(Quiz.id).where(Quiz.created_by_id == user_id)
+    questions = db.select(Question.id).where(Question.quiz_id.in_(quizzes))
+    db.session.execute(db.delete(Answer).where(Answer.question_id.in_(questions)))
+    db.session.execute(db.delete(Question).where(Question.quiz_id.in_(quizzes)))
+    db.session.execute(db.delete(Quiz).where(Quiz.created_by_id == user_id))
+    db.session.execute(db.delete(Subject).where(Subject.created_by_id == user_id))
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    db.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quizzes", type=int, nargs="+", default=[10, 300])
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--create-tables",
+        action="store_true",
+        help="Create the missing tables first (for a scratch database)",
+    )
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        database = db.engine.dialect.name
+
+        statements = 0
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count_statement(*_):
+            nonlocal statements
+            statements += 1
+
+        results = []
+        client = app.test_client()
+        for num_quizzes in args.quizzes:
+            name = f"benchmark-{uuid.uuid4().hex[:8]}"
+            user_id = seed_account(name, num_quizzes, args.questions)
+            token = create_access_token(identity={"id": user_id})
+            headers = {"Authorization": f"Bearer {token}"}
+            try:
+                for endpoint in ENDPOINTS:
+                    runs: List[float] = []
+                    for _ in range(args.repeat):
+                        statements = 0
+                        start = time.perf_counter()
+                        response = client.get(endpoint, headers=headers)
+                        runs.append(time.perf_counter() - start)
+                        if response.status_code != 200:
+                            raise RuntimeError(
+                                f"{endpoint} answered {response.status_code}"
+                            )
+                        db.session.remove()
+
+                    results.append(
+                        {
+                            "name": endpoint,
+                            "params": {
+                                "quizzes": num_quizzes,
+                                "questions": args.questions,
+                            },
+                            "runs": runs,
+                            "min": min(runs),
+                            "median": statistics.median(runs),
+                            "statements": statements,
+                            "rows": len(response.get_json()),
+                        }
+                    )
+            finally:
+                delete_account(user_id)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    # The number of statements of each endpoint must be the same for every account size
+    for endpoint in ENDPOINTS:
+        counts = {r["statements"] for r in results if r["name"] == endpoint}
+        if len(counts) > 1:
+            sys.exit(f"{endpoint} makes a number of SQL statements growing with its rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Load test of the quiz generation workers: enqueues quiz generation jobs through Redis and Celery,
+waits for them and reports the throughput and latencies of the workers.
+
+The workers must be started with `OPENAI_BASE_URL` pointing to the local stand-in server
+(`python -m benchmarks.mock_openai`), unless the load test is meant to use the OpenAI API.
+
+Jobs are submitted in turn by the users of `--user-id` and ask in turn for the numbers of questions
+of `--questions`, so a mixed load (e.g. `--user-id 1 2 --questions 5 100`) shows the latencies of
+each queue class under it.
+
+Usage (from the backend folder):
+    python -m benchmarks.load_test --user-id 1 --subject-id 1 --jobs 1000 --output load.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime, timezone
+from typing import List, Optional
+import requests
+from celery.result import AsyncResult
+import app  # noqa: F401
+import tasks
+from benchmarks.quizgpt import create_pdf
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, nargs="+", required=True)
+    parser.add_argument("--subject-id", type=int, required=True)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--questions", type=int, nargs="+", default=[10])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument(
+        "--same-document",
+        action="store_true",
+        help="Use the same document for every job, so the caches are hit",
+    )
+    parser.add_argument(
+        "--mock-url",
+        default="http://127.0.0.1:8001",
+        help="Stand-in server whose request statistics are reported",
+    )
+    parser.add_argument("--timeout", type=float, default=3600)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="quizgpt-load-test-")
+    try:
+        documents = []
+        for seed in range(1 if args.same_document else args.jobs):
+            path = os.path.join(folder, f"document-{seed}.pdf")
+            create_pdf(path, args.pages, seed=seed)
+            documents.append(path)
+
+        blob_names = [tasks.blob_store.store_file(path) for path in documents]
+
+        started_at = time.perf_counter()
+        jobs = []
+        for i in range(args.jobs):
+            number_of_questions = args.questions[i % len(args.questions)]
+            # Released by the job
+            tasks.blob_leases.acquire([blob_names[i % len(blob_names)]])
+            job_id = tasks.enqueue_quiz(
+                args.user_id[i % len(args.user_id)],
+                args.subject_id,
+                f"Load test quiz {i + 1}",
+                50,
+                "Created by the load test",
+                30,
+                number_of_questions,
+                [blob_names[i % len(blob_names)]],
+            )
+            queue_class = tasks.scheduler.queue_class(number_of_questions)
+            jobs.append((job_id, (queue_class, time.perf_counter())))
+        enqueued_in = time.perf_counter() - started_at
+    finally:
+        shutil.rmtree(folder)
+
+    # Wait for every job, recording when each one was seen finished
+    latencies = []
+    class_latencies = {}
+    states = {}
+    pending = dict(jobs)
+    deadline = started_at + args.timeout
+    while pending and time.perf_counter() < deadline:
+        for task_id, (queue_class, enqueued_at) in list(pending.items()):
+            result = AsyncResult(task_id)
+            if result.ready():
+                latency = time.perf_counter() - enqueued_at
+                latencies.append(latency)
+                class_latencies.setdefault(queue_class, []).append(latency)
+                state = result.state
+                if state == "SUCCESS" and not (result.result or {}).get("quiz_id"):
+                    state = "NO_QUESTIONS"
+                states[state] = states.get(state, 0) + 1
+                del pending[task_id]
+        time.sleep(0.5)
+    duration = time.perf_counter() - started_at
+
+    mock_stats = None
+    try:
+        mock_stats = requests.get(f"{args.mock_url}/stats", timeout=5).json()
+    except requests.RequestException:
+        pass
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "jobs": args.jobs,
+            "questions": args.questions,
+            "pages": args.pages,
+            "same_document": args.same_document,
+        },
+        "enqueued_in": enqueued_in,
+        "duration": duration,
+        "finished_jobs": len(latencies),
+        "timed_out_jobs": len(pending),
+        "states": states,
+        "jobs_per_second": len(latencies) / duration,
+        "latency": {
+            "median": statistics.median(latencies) if latencies else None,
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=None),
+        },
+        "class_latency": {
+            queue_class: {
+                "jobs": len(values),
+                "median": statistics.median(values),
+                "p90": percentile(values, 90),
+                "max": max(values),
+            }
+            for queue_class, values in class_latencies.items()
+        },
+        # Times the jobs waited for a worker, as recorded by the scheduler
+        "queues": tasks.scheduler.stats(),
+        "mock_server": mock_stats,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
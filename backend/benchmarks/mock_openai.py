@@ -0,0 +1,325 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load tests that must not spend money on
+OpenAI. Plain completions (language detection) are answered with a fixed language, structured
+output requests (tool calls for the `Question` and `Exam` schemas) with canned or templated
+questions.
+
+Usage (from the backend folder):
+    python -m benchmarks.mock_openai --port 8001 --latency 1.5 --rate-limit-rate 0.02
+    OPENAI_BASE_URL=http://localhost:8001/v1 celery -A app.celery_app worker --loglevel INFO
+"""
+
+import re
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+from threading import Lock
+from typing import List, Optional
+from flask import Flask, jsonify, request
+
+SERVER_ERROR_STATUSES = (500, 502, 503)
+
+
+class MockSettings:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_stddev: float = 0.0,
+        latency_distribution: str = "constant",
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        server_error_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        language: str = "english",
+        questions: Optional[List[dict]] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.latency_stddev = latency_stddev
+        self.latency_distribution = latency_distribution
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.server_error_rate = server_error_rate
+        self.failure_rate = failure_rate
+        self.language = language
+        self.questions = questions
+        self.random = random.Random(seed)
+        self.lock = Lock()
+
+    def sample_latency(self) -> float:
+        """
+        Returns the number of seconds the next response is delayed by
+        """
+        with self.lock:
+            if self.latency_distribution == "uniform":
+                value = self.random.uniform(
+                    self.latency - self.latency_stddev, self.latency + self.latency_stddev
+                )
+            elif self.latency_distribution == "normal":
+                value = self.random.gauss(self.latency, self.latency_stddev)
+            elif self.latency_distribution == "lognormal" and self.latency > 0:
+                # Parameters of the underlying normal distribution, so the mean and standard
+                # deviation of the latency are the configured ones
+                sigma_squared = math.log(1 + (self.latency_stddev / self.latency) ** 2)
+                value = self.random.lognormvariate(
+                    math.log(self.latency) - sigma_squared / 2, sigma_squared**0.5
+                )
+            else:
+                value = self.latency
+        return max(0.0, value)
+
+    def chance(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+
+def error_response(
+    status: int, message: str, error_type: str, headers: Optional[dict] = None
+):
+    # Same body as the OpenAI API's errors, so the client raises the matching error class
+    response = jsonify(
+        {"error": {"message": message, "type": error_type, "param": None, "code": None}}
+    )
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+def completion_response(model: str, message: dict, prompt: str) -> dict:
+    completion = json.dumps(message)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "logprobs": None,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+            }
+        ],
+        # Rough token counts, a token is about 4 characters of english text
+        "usage": {
+            "prompt_tokens": len(prompt) // 4 + 1,
+            "completion_tokens": len(completion) // 4 + 1,
+            "total_tokens": (len(prompt) + len(completion)) // 4 + 2,
+        },
+    }
+
+
+def sentences(text: str) -> List[str]:
+    return [s for s in re.split(r"(?<=[.!?])\s+", text) if len(s.split()) >= 4]
+
+
+def create_app(settings: MockSettings) -> Flask:
+    app = Flask(__name__)
+    stats = {"requests": 0, "rate_limited": 0, "server_errors": 0, "questions": 0}
+    stats_lock = Lock()
+
+    def count(key: str, value: int = 1) -> None:
+        with stats_lock:
+            stats[key] += value
+
+    def question(text: str) -> dict:
+        """
+        Returns a question about the text, canned if questions were provided, otherwise built
+        from one of the text's sentences
+        """
+        count("questions")
+        if settings.chance(settings.failure_rate):
+            return {
+                "title": "",
+                "answers": [],
+                "language": settings.language,
+                "success": False,
+                "message": "The question could not be generated. Injected failure.",
+            }
+
+        if settings.questions:
+            with settings.lock:
+                canned = settings.random.choice(settings.questions)
+            return {
+                "language": settings.language,
+                "success": True,
+                "message": "",
+                **canned,
+            }
+
+        with settings.lock:
+            candidates = sentences(text) or [text.strip() or "the material"]
+            subject = settings.random.choice(candidates)
+            marker = settings.random.randrange(10**6)
+        subject = " ".join(subject.split()[:12]).rstrip(".!?")
+        return {
+            "title": f"Which of the following is true about: {subject}? (#{marker})",
+            "answers": [
+                {"title": f"Statement {i + 1} about: {subject}", "is_correct": i == 0}
+                for i in range(4)
+            ],
+            "language": settings.language,
+            "success": True,
+            "message": "",
+        }
+
+    def tool_arguments(name: str, prompt: str) -> Optional[dict]:
+        if name == "Question":
+            text = prompt.split("Text:", 1)[-1]
+            return question(text)
+
+        if name == "Exam":
+            # One question per numbered segment of the batched prompt
+            parts = re.split(r"Segment (\d+):", prompt)
+            segments = [
+                {"segment": int(number), **question(text)}
+                for number, text in zip(parts[1::2], parts[2::2])
+            ]
+            return {"questions": segments, "language": settings.language}
+
+        return None
+
+    @app.post("/v1/chat/completions")
+    def chat_completions():
+        count("requests")
+        body = request.get_json(force=True)
+        model = body.get("model", "")
+        prompt = "\n".join(
+            m.get("content") or ""
+            for m in body.get("messages", [])
+            if isinstance(m.get("content"), str)
+        )
+
+        time.sleep(settings.sample_latency())
+
+        if settings.chance(settings.rate_limit_rate):
+            count("rate_limited")
+            return error_response(
+                429,
+                "Rate limit reached (injected by the mock server).",
+                "requests",
+                headers={"retry-after-ms": str(int(settings.retry_after * 1000))},
+            )
+        if settings.chance(settings.server_error_rate):
+            count("server_errors")
+            with settings.lock:
+                status = settings.random.choice(SERVER_ERROR_STATUSES)
+            return error_response(
+                status, "Server error (injected by the mock server).", "server_error"
+            )
+
+        tools = body.get("tools") or []
+        if not tools:
+            message = {"role": "assistant", "content": settings.language}
+            return jsonify(completion_response(model, message, prompt))
+
+        # Structured output requests force the tool of the requested schema
+        tool_choice = body.get("tool_choice")
+        if isinstance(tool_choice, dict):
+            name = tool_choice["function"]["name"]
+        else:
+            name = tools[0]["function"]["name"]
+
+        arguments = tool_arguments(name, prompt)
+        if arguments is None:
+            return error_response(
+                400, f"The mock server cannot generate `{name}`.", "invalid_request_error"
+            )
+
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(arguments)},
+                }
+            ],
+        }
+        return jsonify(completion_response(model, message, prompt))
+
+    @app.get("/stats")
+    def get_stats():
+        with stats_lock:
+            return jsonify(stats)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mean response latency in seconds"
+    )
+    parser.add_argument(
+        "--latency-stddev",
+        type=float,
+        default=0.0,
+        help="Standard deviation (half range for uniform) of the latency in seconds",
+    )
+    parser.add_argument(
+        "--latency-distribution",
+        choices=("constant", "uniform", "normal", "lognormal"),
+        default="constant",
+    )
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0.0,
+        help="Share of the requests answered with a 429 error",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=1.0,
+        help="Seconds the 429 errors ask to wait before retrying",
+    )
+    parser.add_argument(
+        "--server-error-rate",
+        type=float,
+        default=0.0,
+        help="Share of the requests answered with a 500, 502 or 503 error",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Share of the questions returned as unsuccessful",
+    )
+    parser.add_argument("--language", default="english")
+    parser.add_argument(
+        "--questions-file",
+        help="JSON list of canned questions ({title, answers: [{title, is_correct}]}) "
+        "returned instead of the templated ones",
+    )
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    questions = None
+    if args.questions_file:
+        with open(args.questions_file) as f:
+            questions = json.load(f)
+
+    settings = MockSettings(
+        latency=args.latency,
+        latency_stddev=args.latency_stddev,
+        latency_distribution=args.latency_distribution,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        server_error_rate=args.server_error_rate,
+        failure_rate=args.failure_rate,
+        language=args.language,
+        questions=questions,
+        seed=args.seed,
+    )
+    create_app(settings).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
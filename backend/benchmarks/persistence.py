@@ -0,0 +1,153 @@
+"""
+Benchmark of the persistence of generated questions: the ORM unit of work path against the bulk
+insert path of `util.importing`. Runs against the database of `DATABASE_URL`, the rows it creates
+are deleted once it is done.
+
+Usage (from the backend folder):
+    python -m benchmarks.persistence --questions 10 100 500 --output persistence.json
+"""
+
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import statistics
+from datetime import datetime, timezone
+from typing import List
+from sqlalchemy import event
+from app import app, db
+from models import Answer, Question, Quiz, Subject, User
+from util.importing import delete_questions, insert_questions
+
+ANSWERS_PER_QUESTION = 4
+
+
+def generated_questions(num_questions: int) -> List[dict]:
+    return [
+        {
+            "title": f"Question {i + 1}?",
+            "position": i,
+            "answers": [
+                {"title": f"Answer {j + 1}", "is_correct": j == 0}
+                for j in range(ANSWERS_PER_QUESTION)
+            ],
+        }
+        for i in range(num_questions)
+    ]
+
+
+def save_with_orm(quiz: Quiz, questions: List[dict]) -> None:
+    # The path `tasks.create_quiz` used before the bulk inserts
+    for q in questions:
+        question = Question(title=q["title"], position=q["position"])
+        for a in q["answers"]:
+            answer = Answer(title=a["title"], is_correct=a["is_correct"])
+            question.answers.append(answer)
+        quiz.questions.append(question)
+    db.session.commit()
+
+
+def save_with_bulk_inserts(quiz: Quiz, questions: List[dict]) -> None:
+    insert_questions(quiz.id, questions)
+    db.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--create-tables",
+        action="store_true",
+        help="Create the missing tables first (for a scratch database)",
+    )
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        database = db.engine.dialect.name
+
+        statements = 0
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count_statement(*_):
+            nonlocal statements
+            statements += 1
+
+        name = f"benchmark-{uuid.uuid4().hex[:8]}"
+        user = User(name=name, username=name, email=f"{name}@example.com", password="")
+        db.session.add(user)
+        db.session.commit()
+        subject = Subject(title=name, created_by_id=user.id)
+        db.session.add(subject)
+        db.session.commit()
+        user_id, subject_id = user.id, subject.id
+
+        results = []
+        try:
+            for num_questions in args.questions:
+                questions = generated_questions(num_questions)
+                for path, save in [
+                    ("orm", save_with_orm),
+                    ("bulk", save_with_bulk_inserts),
+                ]:
+                    runs = []
+                    for _ in range(args.repeat):
+                        quiz = Quiz(
+                            title=name,
+                            success_percentage=50,
+                            duration=10,
+                            created_by_id=user_id,
+                            subject_id=subject_id,
+                        )
+                        db.session.add(quiz)
+                        db.session.commit()
+                        quiz_id = quiz.id
+
+                        statements = 0
+                        start = time.perf_counter()
+                        save(quiz, questions)
+                        runs.append(time.perf_counter() - start)
+                        run_statements = statements
+
+                        delete_questions(quiz_id)
+                        db.session.execute(db.delete(Quiz).where(Quiz.id == quiz_id))
+                        db.session.commit()
+                        db.session.expunge_all()
+
+                    results.append(
+                        {
+                            "name": "save_questions",
+                            "params": {"path": path, "questions": num_questions},
+                            "runs": runs,
+                            "min": min(runs),
+                            "median": statistics.median(runs),
+                            "statements": run_statements,
+                        }
+                    )
+        finally:
+            db.session.rollback()
+            db.session.execute(db.delete(Subject).where(Subject.id == subject_id))
+            db.session.execute(db.delete(User).where(User.id == user_id))
+            db.session.commit()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
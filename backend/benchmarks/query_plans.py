@@ -0,0 +1,404 @@
+"""
+Query plan regression check: seeds the database of `DATABASE_URL` at scale, calls every endpoint
+of the auth, user and quizzing blueprints, and runs `EXPLAIN` on every SQL statement they make.
+Exits with an error if any statement reads a table with a sequential scan instead of an index.
+
+Meant for a scratch PostgreSQL database migrated with `flask db upgrade` (the plans of SQLite are
+checked with `EXPLAIN QUERY PLAN`, but its planner makes other choices). The rows it creates are
+deleted once it is done. The quiz creation endpoints, which need the workers, are not called.
+
+Usage (from the backend folder):
+    python -m benchmarks.query_plans --users 100 --quizzes 50 --output query_plans.json
+"""
+
+import re
+import sys
+import json
+import uuid
+import argparse
+import platform
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, insert, text
+from app import app, bcrypt, db
+from models import Answer, Question, Quiz, QuizAttempt, Subject, User, UserChoice
+from util.importing import insert_questions
+
+SUBJECTS_PER_USER = 5
+ANSWERS_PER_QUESTION = 4
+PASSWORD = "password"
+# Tables of the models, sequential scans of other tables (e.g. `alembic_version`) are ignored
+TABLES = {
+    model.__tablename__
+    for model in [Answer, Question, Quiz, QuizAttempt, Subject, User, UserChoice]
+}
+
+
+def seed(
+    prefix: str, num_users: int, num_quizzes: int, num_questions: int
+) -> List[int]:
+    """
+    Creates users with subjects, quizzes (with their questions and answers) and an attempt of
+    each quiz. Returns the ids of the users, whose password is `PASSWORD`.
+    """
+    password = bcrypt.generate_password_hash(PASSWORD).decode("utf-8")
+    user_ids = (
+        db.session.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {
+                    "name": f"{prefix}-{i}",
+                    "username": f"{prefix}-{i}",
+                    "email": f"{prefix}-{i}@example.com",
+                    "password": password,
+                    "created_at": datetime.utcnow(),
+                    "modified_at": datetime.utcnow(),
+                }
+                for i in range(num_users)
+            ],
+        )
+        .scalars()
+        .all()
+    )
+
+    for user_id in user_ids:
+        subject_ids = (
+            db.session.execute(
+                insert(Subject).returning(Subject.id, sort_by_parameter_order=True),
+                [
+                    {"title": f"Subject {i + 1}", "created_by_id": user_id}
+                    for i in range(SUBJECTS_PER_USER)
+                ],
+            )
+            .scalars()
+            .all()
+        )
+        quiz_ids = (
+            db.session.execute(
+                insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "title": f"Quiz {i + 1}",
+                        "description": "Created by the query plan check",
+                        "success_percentage": 50,
+                        "duration": 10,
+                        "created_by_id": user_id,
+                        "subject_id": subject_ids[i % len(subject_ids)],
+                        "status": "ready",
+                    }
+                    for i in range(num_quizzes)
+                ],
+            )
+            .scalars()
+            .all()
+        )
+        attempt_ids = (
+            db.session.execute(
+                insert(QuizAttempt).returning(
+                    QuizAttempt.id, sort_by_parameter_order=True
+                ),
+                [
+                    {"quiz_id": quiz_id, "result": 0, "did_pass": False}
+                    for quiz_id in quiz_ids
+                ],
+            )
+            .scalars()
+            .all()
+        )
+
+        choices = []
+        for quiz_id, attempt_id in zip(quiz_ids, attempt_ids):
+            question_ids = insert_questions(
+                quiz_id,
+                [
+                    {
+                        "title": f"Question {j + 1}?",
+                        "position": j,
+                        "answers": [
+                            {"title": f"Answer {k + 1}", "is_correct": k == 0}
+                            for k in range(ANSWERS_PER_QUESTION)
+                        ],
+                    }
+                    for j in range(num_questions)
+                ],
+            )
+            choices.extend(
+                {"quiz_attempt_id": attempt_id, "question_id": question_id}
+                for question_id in question_ids
+            )
+        if choices:
+            db.session.execute(insert(UserChoice), choices)
+        db.session.commit()
+
+    return user_ids
+
+
+def delete_users(user_ids: List[int]) -> None:
+    quizzes = db.select(Quiz.id).where(Quiz.created_by_id.in_(user_ids))
+    questions = db.select(Question.id).where(Question.quiz_id.in_(quizzes))
+    attempts = db.select(QuizAttempt.id).where(QuizAttempt.quiz_id.in_(quizzes))
+    db.session.execute(
+        db.delete(UserChoice).where(UserChoice.quiz_attempt_id.in_(attempts))
+    )
+    db.session.execute(db.delete(QuizAttempt).where(QuizAttempt.quiz_id.in_(quizzes)))
+    db.session.execute(db.delete(Answer).where(Answer.question_id.in_(questions)))
+    db.session.execute(db.delete(Question).where(Question.quiz_id.in_(quizzes)))
+    db.session.execute(db.delete(Quiz).where(Quiz.created_by_id.in_(user_ids)))
+    db.session.execute(db.delete(Subject).where(Subject.created_by_id.in_(user_ids)))
+    db.session.execute(db.delete(User).where(User.id.in_(user_ids)))
+    db.session.commit()
+
+
+def endpoint_calls(
+    user_id: int, prefix: str
+) -> Iterator[Tuple[int, str, str, Optional[dict]]]:
+    """
+    Calling user, method, path and JSON body of a call of every endpoint, on the user's rows.
+    Calls changing rows come last, each on rows no other call uses.
+    """
+    user = db.session.get(User, user_id)
+    # Only subjects without quizzes and users without content can be deleted
+    empty_subject = Subject(title="Empty subject", created_by_id=user_id)
+    deleted_user = User(
+        name=f"{prefix}-deleted",
+        username=f"{prefix}-deleted",
+        email=f"{prefix}-deleted@example.com",
+        password=bcrypt.generate_password_hash(PASSWORD).decode("utf-8"),
+    )
+    db.session.add_all([empty_subject, deleted_user])
+    db.session.commit()
+    subject_ids = (
+        db.session.execute(
+            db.select(Subject.id)
+            .where(Subject.created_by_id == user_id)
+            .order_by(Subject.id)
+        )
+        .scalars()
+        .all()
+    )
+    quiz_ids = (
+        db.session.execute(
+            db.select(Quiz.id).where(Quiz.created_by_id == user_id).order_by(Quiz.id)
+        )
+        .scalars()
+        .all()
+    )
+    attempt = db.session.execute(
+        db.select(QuizAttempt.id, QuizAttempt.quiz_id).where(
+            QuizAttempt.quiz_id == quiz_ids[0]
+        )
+    ).first()
+    questions = db.session.execute(
+        db.select(Question.id, db.func.min(Answer.id))
+        .join(Answer, Answer.question_id == Question.id)
+        .where(Question.quiz_id == quiz_ids[0])
+        .group_by(Question.id)
+    ).all()
+
+    yield user_id, "POST", "/api/auth/login", {"email": user.email, "password": PASSWORD}
+    yield user_id, "GET", "/api/auth/validate", None
+    yield user_id, "GET", "/api/quizzing/subjects", None
+    yield user_id, "GET", "/api/quizzing/subjects?limit=20", None
+    yield user_id, "GET", "/api/quizzing/subjects?search_query=subject", None
+    yield user_id, "GET", f"/api/quizzing/subjects/{subject_ids[0]}", None
+    yield user_id, "GET", "/api/quizzing/quizzes", None
+    yield user_id, "GET", "/api/quizzing/quizzes?limit=20", None
+    yield user_id, "GET", f"/api/quizzing/quizzes?subject_id={subject_ids[0]}", None
+    yield user_id, "GET", "/api/quizzing/quizzes?search_query=quiz", None
+    yield user_id, "GET", f"/api/quizzing/quizzes/{quiz_ids[0]}", None
+    yield (
+        user_id,
+        "GET",
+        f"/api/quizzing/quizzes/{attempt.quiz_id}/attempts/{attempt.id}",
+        None,
+    )
+    yield (
+        user_id,
+        "POST",
+        f"/api/quizzing/quizzes/{quiz_ids[0]}/attempt",
+        {
+            "answered_questions": [
+                {"question_id": question_id, "choice_id": answer_id}
+                for question_id, answer_id in questions
+            ]
+        },
+    )
+    yield user_id, "POST", "/api/quizzing/subjects", {"title": "New subject"}
+    yield (
+        user_id,
+        "PUT",
+        f"/api/quizzing/subjects/{subject_ids[0]}",
+        {"new_title": "Renamed"},
+    )
+    yield user_id, "PUT", "/api/user/change-name", {"new_name": f"{prefix}-renamed"}
+    yield (
+        user_id,
+        "PUT",
+        "/api/user/change-email",
+        {"new_email": f"{prefix}-new@example.com"},
+    )
+    yield user_id, "PUT", "/api/user/change-username", {"new_username": f"{prefix}-new"}
+    yield user_id, "PUT", "/api/user/change-password", {
+        "old_password": PASSWORD,
+        "new_password": "new",
+    }
+    yield user_id, "DELETE", f"/api/quizzing/quizzes/{quiz_ids[-1]}", None
+    yield user_id, "POST", "/api/auth/register", {
+        "name": f"{prefix}-registered",
+        "username": f"{prefix}-registered",
+        "email": f"{prefix}-registered@example.com",
+        "password": PASSWORD,
+    }
+    yield user_id, "DELETE", f"/api/quizzing/subjects/{empty_subject.id}", None
+    yield (
+        deleted_user.id,
+        "DELETE",
+        "/api/user/delete-account",
+        {"password": PASSWORD},
+    )
+
+
+def sequential_scans(statement: str, parameters) -> Tuple[List[str], List[str]]:
+    """
+    Runs `EXPLAIN` on the statement, returns the tables it scans sequentially and the indexes it
+    uses
+    """
+    connection = db.session.connection()
+    scans, indexes = [], []
+
+    if connection.dialect.name == "postgresql":
+        plan = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        ).scalar()
+
+        def walk(node: dict) -> None:
+            if node["Node Type"] == "Seq Scan":
+                scans.append(node["Relation Name"])
+            if "Index Name" in node:
+                indexes.append(node["Index Name"])
+            for child in node.get("Plans", []):
+                walk(child)
+
+        walk(plan[0]["Plan"])
+    else:
+        for row in connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ):
+            # e.g. "SCAN quiz", "SEARCH quiz USING INDEX ix_quiz_created_by_id_id (...)"
+            detail = row[-1]
+            match = re.match(r"SCAN (\w+)", detail)
+            if match and "INDEX" not in detail:
+                scans.append(match.group(1))
+            match = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+            if match:
+                indexes.append(match.group(1))
+            elif "VIRTUAL TABLE INDEX" in detail:
+                indexes.append(detail.split()[1])
+            elif "PRIMARY KEY" in detail:
+                indexes.append("primary key")
+
+    return [table for table in scans if table in TABLES], indexes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--quizzes", type=int, default=50, help="Quizzes per user")
+    parser.add_argument("--questions", type=int, default=10, help="Questions per quiz")
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        database = db.engine.dialect.name
+        prefix = f"plans-{uuid.uuid4().hex[:8]}"
+        user_ids = seed(prefix, args.users, args.quizzes, args.questions)
+        # Up to date statistics, so the planner knows the size of the tables
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        # Statements of the endpoint being called (only the ones `EXPLAIN` accepts)
+        statements: Optional[List[Tuple[str, object]]] = None
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def capture_statement(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            if statements is None or executemany:
+                return
+            if re.match(r"\s*(SELECT|UPDATE|DELETE|WITH)\b", statement, re.IGNORECASE):
+                statements.append((statement, parameters))
+
+        results = []
+        failures = 0
+        client = app.test_client()
+        # A user in the middle of the table, not the first rows a scan would read
+        user_id = user_ids[len(user_ids) // 2]
+        try:
+            for caller_id, method, path, body in list(endpoint_calls(user_id, prefix)):
+                token = create_access_token(identity={"id": caller_id})
+                statements = []
+                response = client.open(
+                    path,
+                    method=method,
+                    json=body,
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                captured, statements = statements, None
+                db.session.remove()
+
+                for statement, parameters in captured:
+                    scans, indexes = sequential_scans(statement, parameters)
+                    failures += bool(scans)
+                    results.append(
+                        {
+                            "endpoint": f"{method} {path}",
+                            "status": response.status_code,
+                            "statement": " ".join(statement.split()),
+                            "sequential_scans": scans,
+                            "indexes": indexes,
+                        }
+                    )
+                db.session.rollback()
+        finally:
+            statements = None
+            event.remove(db.engine, "before_cursor_execute", capture_statement)
+            db.session.rollback()
+            registered = db.session.execute(
+                db.select(User.id).where(User.username.like(f"{prefix}-%"))
+            ).scalars()
+            delete_users(sorted(set(user_ids) | set(registered)))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database,
+        "params": {
+            "users": args.users,
+            "quizzes": args.quizzes,
+            "questions": args.questions,
+        },
+        "statements": len(results),
+        "failures": failures,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if failures:
+        for result in results:
+            if result["sequential_scans"]:
+                print(
+                    f"{result['endpoint']}: sequential scan of "
+                    f"{', '.join(result['sequential_scans'])} in {result['statement']}",
+                    file=sys.stderr,
+                )
+        sys.exit(f"{failures} statements read a table with a sequential scan")
+
+
+if __name__ == "__main__":
+    main()
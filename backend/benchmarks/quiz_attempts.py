@@ -0,0 +1,131 @@
+"""
+Benchmark of quiz attempt submissions: the number of SQL statements and the time a submission
+takes for quizzes of growing sizes, every question answered. The number of statements must not
+grow with the number of questions, the benchmark exits with an error if it does. Runs against the
+database of `DATABASE_URL`, the rows it creates are deleted once it is done.
+
+Usage (from the backend folder):
+    python -m benchmarks.quiz_attempts --questions 10 200 --output quiz_attempts.json
+"""
+
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import statistics
+from datetime import datetime, timezone
+from typing import List
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import app, db
+from models import Answer, Question, Quiz, QuizAttempt, UserChoice
+from benchmarks.list_queries import delete_account, seed_account
+
+
+def delete_attempts(quiz_id: int) -> None:
+    attempts = db.select(QuizAttempt.id).where(QuizAttempt.quiz_id == quiz_id)
+    db.session.execute(
+        db.delete(UserChoice).where(UserChoice.quiz_attempt_id.in_(attempts))
+    )
+    db.session.execute(db.delete(QuizAttempt).where(QuizAttempt.quiz_id == quiz_id))
+    db.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--create-tables",
+        action="store_true",
+        help="Create the missing tables first (for a scratch database)",
+    )
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        database = db.engine.dialect.name
+
+        statements = 0
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count_statement(*_):
+            nonlocal statements
+            statements += 1
+
+        results = []
+        client = app.test_client()
+        for num_questions in args.questions:
+            name = f"benchmark-{uuid.uuid4().hex[:8]}"
+            user_id = seed_account(name, 1, num_questions)
+            quiz_id = db.session.execute(
+                db.select(Quiz.id).where(Quiz.created_by_id == user_id)
+            ).scalar_one()
+            # The first answer of each question, the correct one
+            answered_questions = [
+                {"question_id": question_id, "choice_id": choice_id}
+                for question_id, choice_id in db.session.execute(
+                    db.select(Question.id, db.func.min(Answer.id))
+                    .join(Answer, Answer.question_id == Question.id)
+                    .where(Question.quiz_id == quiz_id)
+                    .group_by(Question.id)
+                )
+            ]
+            db.session.remove()
+
+            token = create_access_token(identity={"id": user_id})
+            headers = {"Authorization": f"Bearer {token}"}
+            endpoint = f"/api/quizzing/quizzes/{quiz_id}/attempt"
+            try:
+                runs: List[float] = []
+                for _ in range(args.repeat):
+                    statements = 0
+                    start = time.perf_counter()
+                    response = client.post(
+                        endpoint,
+                        json={"answered_questions": answered_questions},
+                        headers=headers,
+                    )
+                    runs.append(time.perf_counter() - start)
+                    if response.status_code != 201:
+                        raise RuntimeError(f"{endpoint} answered {response.status_code}")
+                    db.session.remove()
+
+                results.append(
+                    {
+                        "name": "create_quiz_attempt",
+                        "params": {"questions": num_questions},
+                        "runs": runs,
+                        "min": min(runs),
+                        "median": statistics.median(runs),
+                        "statements": statements,
+                    }
+                )
+            finally:
+                delete_attempts(quiz_id)
+                delete_account(user_id)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    # The number of statements of a submission must be the same for every quiz size
+    if len({r["statements"] for r in results}) > 1:
+        sys.exit("Quiz attempts make a number of SQL statements growing with the questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Benchmarks of the QuizGPT pipeline, run against a fake GPT so no request is sent to OpenAI.
+
+Usage (from the backend folder):
+    python -m benchmarks.quizgpt --output benchmark.json
+    python -m benchmarks.quizgpt --baseline benchmark.json --tolerance 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+# `util` modules expect the app to be imported first
+import app  # noqa: F401
+import fitz
+from util.quizgpt.index import QuizGPT
+from util.quizgpt.document_cache import DocumentCache
+from benchmarks.fake_gpt import FakeGPT, FakeGPTClients
+
+WORDS = (
+    "cell membrane protein energy enzyme structure function molecule organism tissue "
+    "reaction system process transport signal gene expression division growth pathway"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + "."
+
+
+def create_pdf(path: str, num_pages: int, seed: int = 0) -> None:
+    """
+    Creates a PDF of `num_pages` pages of english looking paragraphs
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+    for _ in range(num_pages):
+        page = document.new_page()
+        paragraphs = [
+            " ".join(sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(4)
+        ]
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n\n".join(paragraphs))
+    document.save(path)
+    document.close()
+
+
+def measure(function: Callable[[], object], repeat: int) -> List[float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def result(name: str, params: dict, runs: List[float], **extra) -> dict:
+    return {
+        "name": name,
+        "params": params,
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        **extra,
+    }
+
+
+def bench_ingestion(folder: str, page_counts: List[int], repeat: int) -> List[dict]:
+    results = []
+    for num_pages in page_counts:
+        path = os.path.join(folder, f"ingestion-{num_pages}.pdf")
+        create_pdf(path, num_pages)
+
+        def ingest(document_cache=None):
+            QuizGPT(
+                files=[path], document_cache=document_cache, clients=FakeGPTClients()
+            ).close()
+
+        params = {"pages": num_pages}
+        results.append(
+            result("ingestion", {**params, "cache": "none"}, measure(ingest, repeat))
+        )
+
+        # The first ingestion fills the cache, the measured ones are cache hits
+        cache = DocumentCache(os.path.join(folder, "cache"), max_size=1024**3)
+        ingest(cache)
+        results.append(
+            result(
+                "ingestion",
+                {**params, "cache": "hit"},
+                measure(lambda: ingest(cache), repeat),
+            )
+        )
+    return results
+
+
+def bench_clean_text(quiz_gpt: QuizGPT, repeat: int) -> List[dict]:
+    rng = random.Random(0)
+    # Raw PDF text: lines broken in the middle of paragraphs, blank lines between paragraphs
+    text = "\n\n".join(
+        "\n".join(sentence(rng) for _ in range(5)) for _ in range(20000)
+    )
+    runs = measure(lambda: quiz_gpt._clean_text(text), repeat)
+    return [
+        result(
+            "clean_text",
+            {"characters": len(text)},
+            runs,
+            characters_per_second=len(text) / statistics.median(runs),
+        )
+    ]
+
+
+def bench_split_content(
+    quiz_gpt: QuizGPT, question_counts: List[int], repeat: int
+) -> List[dict]:
+    results = []
+    for num_questions in question_counts:
+
+        def split():
+            # Drop the segmenter, so the sentences are scanned and counted again
+            quiz_gpt._segmenter = None
+            quiz_gpt._split_content(num_questions)
+
+        results.append(
+            result(
+                "split_content",
+                {"pages": len(quiz_gpt.pages), "questions": num_questions},
+                measure(split, repeat),
+            )
+        )
+    return results
+
+
+def bench_generate_questions(
+    path: str, question_counts: List[int], args: argparse.Namespace
+) -> List[dict]:
+    results = []
+    for num_questions in question_counts:
+        gpt = FakeGPT(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            failure_rate=args.failure_rate,
+            error_rate=args.error_rate,
+        )
+        quiz_gpt = QuizGPT(
+            files=[path],
+            max_concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            clients=FakeGPTClients(gpt),
+        )
+        try:
+            questions = []
+
+            def generate():
+                questions[:] = quiz_gpt.generate_questions(num_questions)[0]
+
+            runs = measure(generate, args.repeat)
+        finally:
+            quiz_gpt.close()
+
+        results.append(
+            result(
+                "generate_questions",
+                {
+                    "questions": num_questions,
+                    "concurrency": args.concurrency,
+                    "batch_size": args.batch_size,
+                    "latency": args.latency,
+                    "failure_rate": args.failure_rate,
+                    "error_rate": args.error_rate,
+                },
+                runs,
+                generated_questions=len(questions),
+                gpt_requests_per_run=gpt.requests / args.repeat,
+                questions_per_second=num_questions / statistics.median(runs),
+            )
+        )
+    return results
+
+
+# Measures of a result that must not grow compared to the baseline: its median time and its
+# number of GPT requests
+COMPARED_MEASURES = ("median", "gpt_requests_per_run")
+
+
+def result_key(result: dict) -> Tuple[str, str]:
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """
+    Returns the regressions of the results compared to the baseline results of the same
+    benchmarks: the measures more than `tolerance` (a fraction) above the baseline's
+    """
+    baseline_results: Dict[Tuple[str, str], dict] = {result_key(r): r for r in baseline}
+    regressions = []
+    for current in results:
+        previous = baseline_results.get(result_key(current))
+        if previous is None:
+            continue
+        for measure_name in COMPARED_MEASURES:
+            if measure_name not in current or measure_name not in previous:
+                continue
+            if current[measure_name] > previous[measure_name] * (1 + tolerance):
+                regressions.append(
+                    f"{current['name']} {current['params']}: {measure_name} "
+                    f"{current[measure_name]:.4g} > {previous[measure_name]:.4g} "
+                    "(baseline)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument(
+        "--questions", type=int, nargs="+", default=[5, 20, 50, 100]
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Fake GPT latency in seconds"
+    )
+    parser.add_argument("--latency-jitter", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--baseline",
+        help="JSON results file of a previous run, exits with an error if a median "
+        "time or number of GPT requests got worse than it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Fraction a measure may exceed the baseline by (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    # Read first, so a bad baseline file fails before the benchmarks run
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    folder = tempfile.mkdtemp(prefix="quizgpt-benchmark-")
+    try:
+        results = bench_ingestion(folder, args.pages, args.repeat)
+
+        path = os.path.join(folder, "generation.pdf")
+        create_pdf(path, 100)
+        quiz_gpt = QuizGPT(files=[path], clients=FakeGPTClients())
+        try:
+            results += bench_clean_text(quiz_gpt, args.repeat)
+            results += bench_split_content(quiz_gpt, args.questions, args.repeat)
+        finally:
+            quiz_gpt.close()
+
+        results += bench_generate_questions(path, args.questions, args)
+    finally:
+        shutil.rmtree(folder)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit("Regressions compared to the baseline:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,10 +16,111 @@ class Config(object):
     SQLALCHEMY_ECHO = False  # Set to True to see SQL queries output in the console
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
     UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER") or "/uploads"
+    # Parsed documents (cleaned pages + detected language) of previously uploaded files
+    DOCUMENT_CACHE_FOLDER = os.environ.get("DOCUMENT_CACHE_FOLDER") or os.path.join(
+        UPLOAD_FOLDER, ".document-cache"
+    )
+    DOCUMENT_CACHE_MAX_SIZE = int(
+        os.environ.get("DOCUMENT_CACHE_MAX_SIZE") or 1024 * 1024 * 1024
+    )  # 1 GB limit
+    # Store of the uploaded files: "filesystem" (a folder shared by the web and worker nodes)
+    # or "s3" (any S3 compatible storage, e.g. MinIO)
+    BLOB_STORE = os.environ.get("BLOB_STORE") or "filesystem"
+    BLOB_STORE_FOLDER = os.environ.get("BLOB_STORE_FOLDER") or os.path.join(
+        UPLOAD_FOLDER, "blobs"
+    )
+    S3_BUCKET = os.environ.get("S3_BUCKET") or "exam-buddy"
+    # e.g. http://localhost:9000 for a local MinIO server (default: AWS)
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+    S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY")
+    S3_REGION = os.environ.get("S3_REGION")
+    # Seconds a stored file no quiz generation job uses is kept before it is deleted, so the same
+    # file uploaded again meanwhile is not stored (nor parsed) again
+    BLOB_RETENTION = int(os.environ.get("BLOB_RETENTION") or 24 * 60 * 60)
+    # Seconds after which a job that never released its files (e.g. its worker was killed) stops
+    # holding them
+    BLOB_LEASE_DURATION = int(os.environ.get("BLOB_LEASE_DURATION") or 24 * 60 * 60)
+    # Seconds between the runs of the Celery beat task deleting the unused files
+    BLOB_COLLECT_INTERVAL = int(os.environ.get("BLOB_COLLECT_INTERVAL") or 60 * 60)
     ALLOWED_EXTENSIONS = {"pdf"}
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB limit
+    # Maximum number of GPT requests a single quiz generation job may have in flight at once
+    QUIZGPT_MAX_CONCURRENCY = int(os.environ.get("QUIZGPT_MAX_CONCURRENCY") or 8)
+    # Number of questions generated by a single GPT request (1 disables batching)
+    QUIZGPT_BATCH_SIZE = int(os.environ.get("QUIZGPT_BATCH_SIZE") or 1)
+    # Maximum number of material text tokens a single question is generated from
+    QUIZGPT_MAX_SEGMENT_TOKENS = int(os.environ.get("QUIZGPT_MAX_SEGMENT_TOKENS") or 3000)
+    # Minimum number of material text tokens needed to generate a single question
+    QUIZGPT_MIN_SEGMENT_TOKENS = int(os.environ.get("QUIZGPT_MIN_SEGMENT_TOKENS") or 100)
+    # Cache of generated questions, stored in the Celery broker's Redis unless configured otherwise
+    RESPONSE_CACHE_URL = (
+        os.environ.get("RESPONSE_CACHE_URL")
+        or os.environ.get("CELERY_BROKER_URL")
+        or "redis://localhost"
+    )
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL") or 7 * 24 * 60 * 60)
+    RESPONSE_CACHE_MAX_ENTRIES = int(
+        os.environ.get("RESPONSE_CACHE_MAX_ENTRIES") or 100000
+    )
+    # OpenAI compatible API the GPT requests are sent to, e.g. the local stand-in server
+    # `benchmarks/mock_openai.py` for load tests (default: the OpenAI API)
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+    # Size of each worker process' pool of kept alive connections to the OpenAI API
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS") or 20)
+    # OpenAI account limits, shared by every worker through the rate limiter's Redis
+    OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_REQUESTS_PER_MINUTE") or 500)
+    OPENAI_TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TOKENS_PER_MINUTE") or 30000)
+    RATE_LIMITER_URL = (
+        os.environ.get("RATE_LIMITER_URL")
+        or os.environ.get("CELERY_BROKER_URL")
+        or "redis://localhost"
+    )
+    # Quiz generation jobs are routed to the small, medium or large queue by their number of
+    # questions, each queue should have its own workers so small jobs never wait for large ones
+    QUIZ_QUEUE_SMALL_MAX_QUESTIONS = int(
+        os.environ.get("QUIZ_QUEUE_SMALL_MAX_QUESTIONS") or 10
+    )
+    QUIZ_QUEUE_MEDIUM_MAX_QUESTIONS = int(
+        os.environ.get("QUIZ_QUEUE_MEDIUM_MAX_QUESTIONS") or 40
+    )
+    # Number of questions each user's jobs of a queue may generate per turn, when several users
+    # have jobs waiting in the queue
+    QUIZ_SCHEDULER_QUANTUM = int(os.environ.get("QUIZ_SCHEDULER_QUANTUM") or 10)
+    # Seconds after which identical quiz generation requests stop waiting for a job that started
+    # but is still not done and start their own job (e.g. when its worker was killed)
+    QUIZ_SINGLE_FLIGHT_MAX_DURATION = int(
+        os.environ.get("QUIZ_SINGLE_FLIGHT_MAX_DURATION") or 60 * 60
+    )
+    # Same for a job that is still waiting in its queue, which is longer: a queued job is not lost
+    QUIZ_SINGLE_FLIGHT_MAX_QUEUE_DURATION = int(
+        os.environ.get("QUIZ_SINGLE_FLIGHT_MAX_QUEUE_DURATION") or 24 * 60 * 60
+    )
+    # Seconds after which a quiz still generating is failed, its job was lost (e.g. its worker was
+    # killed). Must be longer than the longest quiz generation.
+    QUIZ_GENERATION_TIMEOUT = int(os.environ.get("QUIZ_GENERATION_TIMEOUT") or 60 * 60)
+    # Seconds between the runs of the Celery beat task failing the quizzes generating for too long
+    QUIZ_GENERATION_CHECK_INTERVAL = int(
+        os.environ.get("QUIZ_GENERATION_CHECK_INTERVAL") or 5 * 60
+    )
+    SCHEDULER_URL = (
+        os.environ.get("SCHEDULER_URL")
+        or os.environ.get("CELERY_BROKER_URL")
+        or "redis://localhost"
+    )
     CELERY = dict(
         broker_url=os.environ.get("CELERY_BROKER_URL") or "redis://localhost",
         result_backend=os.environ.get("CELERY_RESULT_BACKEND") or "redis://localhost",
         task_ignore_result=True,
+        # Periodic tasks, run by `celery beat`
+        beat_schedule={
+            "collect-blobs": {
+                "task": "tasks.collect_blobs",
+                "schedule": BLOB_COLLECT_INTERVAL,
+            },
+            "fail-stale-quizzes": {
+                "task": "tasks.fail_stale_quizzes",
+                "schedule": QUIZ_GENERATION_CHECK_INTERVAL,
+            },
+        },
     )
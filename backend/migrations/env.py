@@ -51,6 +51,22 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Keeps autogenerated migrations from dropping the full text search columns, indexes and
+    tables, which are created by migrations but are not part of the models (see
+    `util/search.py`)
+    """
+    if reflected and compare_to is None:
+        if type_ == 'column' and name == 'search_vector':
+            return False
+        if type_ == 'index' and name.endswith('_search_vector'):
+            return False
+        if type_ == 'table' and '_search' in name:
+            return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +81,10 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url,
+        target_metadata=get_metadata(),
+        literal_binds=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -93,6 +112,8 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,46 @@
+"""Add quiz generation start time
+
+Revision ID: 385ec687dc99
+Revises: 3f15211c874a
+Create Date: 2026-10-18 16:22:17.009167
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '385ec687dc99'
+down_revision = '3f15211c874a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('quiz', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('generation_started_at', sa.DateTime(), nullable=True))
+
+    # The quizzes already generating time out from now on
+    op.execute(
+        "UPDATE quiz SET generation_started_at = CURRENT_TIMESTAMP WHERE status = 'generating'"
+    )
+
+    # Without locking the table for writes on PostgreSQL, which can't be done in a transaction
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index('ix_quiz_status_generation_started_at', 'quiz', ['status', 'generation_started_at'], unique=False, postgresql_concurrently=True)
+    else:
+        with op.batch_alter_table('quiz', schema=None) as batch_op:
+            batch_op.create_index('ix_quiz_status_generation_started_at', ['status', 'generation_started_at'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_quiz_status_generation_started_at', table_name='quiz', postgresql_concurrently=True)
+    else:
+        with op.batch_alter_table('quiz', schema=None) as batch_op:
+            batch_op.drop_index('ix_quiz_status_generation_started_at')
+
+    with op.batch_alter_table('quiz', schema=None) as batch_op:
+        batch_op.drop_column('generation_started_at')
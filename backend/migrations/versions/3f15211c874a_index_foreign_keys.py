@@ -0,0 +1,54 @@
+"""Index foreign keys
+
+Revision ID: 3f15211c874a
+Revises: a3f1c9d2e4b7
+Create Date: 2026-10-18 16:02:38.406485
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f15211c874a'
+down_revision = 'a3f1c9d2e4b7'
+branch_labels = None
+depends_on = None
+
+
+# Name, table and columns of each index
+INDEXES = [
+    ('ix_answer_question_id', 'answer', ['question_id']),
+    ('ix_question_quiz_id_position', 'question', ['quiz_id', 'position']),
+    ('ix_quiz_created_by_id_id', 'quiz', ['created_by_id', 'id']),
+    ('ix_quiz_subject_id', 'quiz', ['subject_id']),
+    ('ix_quiz_attempt_quiz_id', 'quiz_attempt', ['quiz_id']),
+    ('ix_subject_created_by_id_id', 'subject', ['created_by_id', 'id']),
+    ('ix_user_choice_choice_id', 'user_choice', ['choice_id']),
+    ('ix_user_choice_question_id', 'user_choice', ['question_id']),
+    ('ix_user_choice_quiz_attempt_id', 'user_choice', ['quiz_attempt_id']),
+]
+
+
+def upgrade():
+    # On PostgreSQL the indexes are built without locking the tables for writes, which can't be
+    # done in a transaction
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.drop_index(name)
@@ -0,0 +1,92 @@
+"""Add full text search
+
+Revision ID: a3f1c9d2e4b7
+Revises: 7b1e4c2a9d3f
+Create Date: 2026-10-18 16:20:37.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e4b7'
+down_revision = '7b1e4c2a9d3f'
+branch_labels = None
+depends_on = None
+
+# Searched columns of each table, see `util/search.py`
+SEARCHED_COLUMNS = {
+    'subject': ['title'],
+    'quiz': ['title', 'description'],
+}
+# Weights of the searched columns in the PostgreSQL relevance
+WEIGHTS = ['A', 'B']
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    for table, columns in SEARCHED_COLUMNS.items():
+        if dialect == 'postgresql':
+            # Kept up to date by PostgreSQL. The 'simple' configuration does not stem the words,
+            # quizzes are in any language.
+            vector = ' || '.join(
+                f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+                for column, weight in zip(columns, WEIGHTS)
+            )
+            op.execute(
+                f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+                f'GENERATED ALWAYS AS ({vector}) STORED'
+            )
+            op.create_index(
+                f'ix_{table}_search_vector',
+                table,
+                ['search_vector'],
+                postgresql_using='gin',
+            )
+
+        elif dialect == 'sqlite':
+            # External content FTS5 table, kept up to date by triggers
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{column}' for column in columns)
+            old_values = ', '.join(f'old.{column}' for column in columns)
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_search USING fts5({names}, "
+                f"content='{table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {table}_search(rowid, {names}) VALUES (new.id, {new_values}); '
+                f'END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {table}_search({table}_search, rowid, {names}) "
+                f"VALUES ('delete', old.id, {old_values}); "
+                f'END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {names} ON {table} BEGIN '
+                f"INSERT INTO {table}_search({table}_search, rowid, {names}) "
+                f"VALUES ('delete', old.id, {old_values}); "
+                f'INSERT INTO {table}_search(rowid, {names}) VALUES (new.id, {new_values}); '
+                f'END'
+            )
+            op.execute(f"INSERT INTO {table}_search({table}_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    for table in SEARCHED_COLUMNS:
+        if dialect == 'postgresql':
+            op.drop_index(f'ix_{table}_search_vector', table_name=table)
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.drop_column('search_vector')
+
+        elif dialect == 'sqlite':
+            for trigger in ['insert', 'delete', 'update']:
+                op.execute(f'DROP TRIGGER {table}_search_{trigger}')
+            op.execute(f'DROP TABLE {table}_search')
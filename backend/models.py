@@ -15,15 +15,23 @@ class Answer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     is_correct = db.Column(db.Boolean, default=False)
-    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("question.id"), nullable=False, index=True
+    )
 
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), nullable=False)
+    # Index of the material segment the question was generated from, questions are saved as
+    # they are generated so they are not saved in order
+    position = db.Column(db.Integer)
     answers = relationship("Answer", backref="question", cascade="all, delete-orphan")
 
+    # The questions of a quiz are read in order
+    __table_args__ = (db.Index("ix_question_quiz_id_position", "quiz_id", "position"),)
+
 
 class Subject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,6 +39,9 @@ class Subject(db.Model):
     created_by_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     created_by = relationship("User", backref="subjects")
 
+    # The subjects of a user are listed by id
+    __table_args__ = (db.Index("ix_subject_created_by_id_id", "created_by_id", "id"),)
+
 
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -40,17 +51,46 @@ class Quiz(db.Model):
     duration = db.Column(db.Integer, nullable=False)
     created_by_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     created_by = relationship("User", backref="quizzes")
-    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False)
+    subject_id = db.Column(
+        db.Integer, db.ForeignKey("subject.id"), nullable=False, index=True
+    )
     subject = relationship("Subject", backref="quizzes")
-    questions = relationship("Question", backref="quiz", cascade="all, delete-orphan")
+    # "generating" while its questions are being generated (and saved one by one), "ready" once
+    # they all are, "failed" if the generation stopped before it was done
+    status = db.Column(
+        db.String(20), nullable=False, default="ready", server_default="ready"
+    )
+    # When its questions started being generated, a quiz still "generating" long after that lost
+    # its job (e.g. its worker was killed), see `tasks.fail_stale_quizzes`
+    generation_started_at = db.Column(db.DateTime, nullable=True)
+    questions = relationship(
+        "Question",
+        backref="quiz",
+        cascade="all, delete-orphan",
+        order_by="[Question.position, Question.id]",
+    )
+
+    __table_args__ = (
+        # The quizzes of a user are listed by id
+        db.Index("ix_quiz_created_by_id_id", "created_by_id", "id"),
+        # The stale generating quizzes are looked for periodically
+        db.Index(
+            "ix_quiz_status_generation_started_at", "status", "generation_started_at"
+        ),
+    )
 
 
 class UserChoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
-    choice_id = db.Column(db.Integer, db.ForeignKey("answer.id"), nullable=True)
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("question.id"), nullable=False, index=True
+    )
+    # Also checked by the foreign key when answers are deleted
+    choice_id = db.Column(
+        db.Integer, db.ForeignKey("answer.id"), nullable=True, index=True
+    )
     quiz_attempt_id = db.Column(
-        db.Integer, db.ForeignKey("quiz_attempt.id"), nullable=False
+        db.Integer, db.ForeignKey("quiz_attempt.id"), nullable=False, index=True
     )
     question = relationship("Question", backref="user_choices")
     choice = relationship("Answer", backref="user_choices")
@@ -58,7 +98,9 @@ class UserChoice(db.Model):
 
 class QuizAttempt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), nullable=False)
+    quiz_id = db.Column(
+        db.Integer, db.ForeignKey("quiz.id"), nullable=False, index=True
+    )
     quiz = relationship("Quiz", backref="attempts")
     result = db.Column(db.Integer, nullable=False)
     did_pass = db.Column(db.Boolean, nullable=False)
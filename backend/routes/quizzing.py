@@ -1,32 +1,76 @@
-import os
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, abort, jsonify, request
+from sqlalchemy import func, insert
 from app import db, app
-from werkzeug.utils import secure_filename
-from util.index import allowed_file, get_file_extension, remove_files
+from util.index import allowed_file, get_file_extension
+from util.blob_store import blob_name
+from util.uploads import has_pdf_signature
+from util.pagination import KeysetPage, parse_fields
+from util.search import search
 from models import Quiz, Question, Answer, Subject, QuizAttempt, UserChoice
 from flask_jwt_extended import jwt_required
 from flask_jwt_extended import current_user
-from uuid import uuid4
 import tasks
+from util.quizgpt.index import QuizGPT
 
 quizzing_blueprint = Blueprint("auth", __name__, url_prefix="/api")
 
 
+SUBJECT_FIELDS = ("id", "title", "created_by_id")
+QUIZ_FIELDS = (
+    "id",
+    "subject_id",
+    "subject_title",
+    "title",
+    "success_percentage",
+    "description",
+    "duration",
+    "created_by_id",
+    "number_of_questions",
+    "status",
+)
+
+
+def list_response(rows, fields, next_cursor):
+    """
+    Response of a list endpoint with the requested fields of the rows, the cursor of the next
+    page (if any) is sent in the `X-Next-Cursor` header
+    """
+    response = jsonify([{field: row[field] for field in fields} for row in rows])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
 # Get Subjects
 @quizzing_blueprint.route("/subjects", methods=["GET"])
 @jwt_required()
 def get_subjects():
     search_query = request.args.get("search_query")
-    subjects = Subject.query.filter_by(created_by_id=current_user.id)
+    try:
+        fields = parse_fields(request.args.get("fields"), SUBJECT_FIELDS)
+        page = KeysetPage.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Only the requested columns are read, and the ids the pages are split by
+    columns = {
+        "id": Subject.id,
+        "title": Subject.title,
+        "created_by_id": Subject.created_by_id,
+    }
+    subjects = db.select(
+        *(columns[field].label(field) for field in dict.fromkeys(["id", *fields]))
+    ).where(Subject.created_by_id == current_user.id)
+    rank = None
     if search_query:
-        # escape any single or doble quotes in the search query
-        search_query = search_query.replace("'", "").replace('"', "")
-        subjects = subjects.filter(Subject.title.ilike(f"%{search_query}%"))
-    subjects_data = [
-        {"id": s.id, "title": s.title, "created_by_id": s.created_by_id}
-        for s in subjects.all()
-    ]
-    return jsonify(subjects_data)
+        # Most relevant first
+        subjects, rank = search(subjects, Subject, search_query)
+
+    try:
+        rows, next_cursor = page.fetch(subjects, Subject.id, rank)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return list_response(rows, fields, next_cursor)
 
 
 @quizzing_blueprint.route("/subjects/<int:subject_id>", methods=["GET"])
@@ -90,13 +134,109 @@ def delete_subject(subject_id):
     )
 
 
+def validate_uploaded_files(files):
+    """
+    Validates the uploaded files, their extension and their content.
+
+    Returns an error response if the files are invalid, `None` otherwise.
+    """
+    if len(files) <= 0:
+        return jsonify({"message": "No files part in the request"}), 400
+
+    for file in files:
+        # If the user does not select a file, the browser submits an
+        # empty file without a filename.
+        if not file.filename:
+            return jsonify({"message": "No selected file"}), 400
+
+        if file and not allowed_file(file.filename):
+            return (
+                jsonify(
+                    {
+                        "error": "Invalid file extension, supported extensions are: "
+                        + ", ".join(app.config["ALLOWED_EXTENSIONS"])
+                    }
+                ),
+                400,
+            )
+
+        if get_file_extension(file.filename) == "pdf" and not has_pdf_signature(
+            file.stream
+        ):
+            return jsonify({"error": f"{file.filename} is not a valid PDF file"}), 400
+
+    return None
+
+
+def store_uploaded_files(files):
+    """
+    Stores the uploaded files in the blob store, files that were already uploaded before are not
+    stored again. Returns the blob names of the files, leased for the quiz generation job (which
+    releases them), so they are not deleted before the job is done with them.
+    """
+    # Leased before they are stored, so a blob that was already stored is not deleted meanwhile
+    tasks.blob_leases.acquire(
+        [
+            blob_name(file.stream.sha256.hexdigest(), get_file_extension(file.filename))
+            for file in files
+        ]
+    )
+    return [
+        tasks.blob_store.store(
+            file.stream,
+            file.stream.sha256.hexdigest(),
+            get_file_extension(file.filename),
+        )
+        for file in files
+    ]
+
+
+def preflight_quiz(files, number_of_questions):
+    """
+    Extracts the text of the uploaded files and plans the quiz generation locally, without any GPT
+    request. The files are parsed where they were streamed to during the upload, on the request's
+    thread. The parsed files are not cached: the document cache is local to each node, and the
+    quiz generation job may run on any worker node, which parses the files from the blob store.
+    """
+    quiz_gpt = QuizGPT(
+        files=[file.stream.name for file in files],
+        batch_size=app.config["QUIZGPT_BATCH_SIZE"],
+        max_segment_tokens=app.config["QUIZGPT_MAX_SEGMENT_TOKENS"],
+        gpt_language_detection=False,
+    )
+    try:
+        return quiz_gpt.preflight(
+            number_of_questions,
+            min_segment_tokens=app.config["QUIZGPT_MIN_SEGMENT_TOKENS"],
+        )
+    finally:
+        quiz_gpt.close()
+
+
+# Preflight Quiz
+@quizzing_blueprint.route("/quizzes/preflight", methods=["POST"])
+@jwt_required()
+def preflight_quiz_creation():
+    number_of_questions = request.form.get("number_of_questions")
+    number_of_questions = int(number_of_questions) if number_of_questions else 0
+
+    if number_of_questions < 1:
+        return jsonify({"error": "Key 'number_of_questions' must be at least 1"}), 400
+
+    files = request.files.getlist("file")
+    error = validate_uploaded_files(files)
+    if error:
+        return error
+
+    preflight = preflight_quiz(files, number_of_questions)
+
+    return jsonify(preflight), 200
+
+
 # Create Quiz
 @quizzing_blueprint.route("/quizzes", methods=["POST"])
 @jwt_required()
 def create_quiz():
-    # Used for error handling and/or cleanup
-    created_files_paths = []
-
     files = request.files.getlist("file")
 
     data = request.form.to_dict()
@@ -115,50 +255,43 @@ def create_quiz():
     except:
         return jsonify({"error": "Invalid subject id"}), 400
 
-    if len(files) <= 0:
-        return jsonify({"message": "No files part in the request"}), 400
+    if number_of_questions < 1:
+        return jsonify({"error": "Key 'number_of_questions' must be at least 1"}), 400
 
-    for file in files:
-        # If the user does not select a file, the browser submits an
-        # empty file without a filename.
-        if not file.filename:
-            remove_files(created_files_paths)
-            return jsonify({"message": "No selected file"}), 400
+    error = validate_uploaded_files(files)
+    if error:
+        return error
 
-        if file and not allowed_file(file.filename):
-            remove_files(created_files_paths)
-            return (
-                jsonify(
-                    {
-                        "error": "Invalid file extension, supported extensions are: "
-                        + app.config["ALLOWED_EXTENSIONS"]
-                    }
-                ),
-                400,
-            )
-
-    for file in files:
-        if file:
-            filename = secure_filename(file.filename)
-            filename = str(uuid4()) + "." + get_file_extension(file.filename)
+    preflight = preflight_quiz(files, number_of_questions)
 
-            file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-
-            file.save(file_path)
-            created_files_paths.append(file_path)
+    # Reject the quiz before any worker or GPT time is spent on it
+    if preflight["number_of_questions"] < 1:
+        return (
+            jsonify(
+                {
+                    "error": "The provided content is too short to generate questions.",
+                    "preflight": preflight,
+                }
+            ),
+            400,
+        )
 
-    task = tasks.create_quiz.delay(
+    # Queued behind the user's other jobs, the workers share their time between the users.
+    # Identical requests share the same job, and the questions generated recently are reused.
+    job_id = tasks.enqueue_quiz(
         current_user.id,
         subject_id,
         title,
         success_percentage,
         description,
         duration,
-        number_of_questions,
-        created_files_paths,
+        # Clamped to the number of questions the content is long enough for
+        preflight["number_of_questions"],
+        store_uploaded_files(files),
+        preflight["language"],
     )
 
-    return jsonify({"task_id": task.id}), 202
+    return jsonify({"task_id": job_id, "preflight": preflight}), 202
 
 
 # Get Quizzes
@@ -167,37 +300,51 @@ def create_quiz():
 def get_quizzes():
     search_query = request.args.get("search_query")
     subject_id = request.args.get("subject_id")
+    try:
+        fields = parse_fields(request.args.get("fields"), QUIZ_FIELDS)
+        page = KeysetPage.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # A single query, reading only the requested columns and the ids the pages are split by
+    columns = {
+        "id": Quiz.id,
+        "subject_id": Quiz.subject_id,
+        "subject_title": Subject.title,
+        "title": Quiz.title,
+        "success_percentage": Quiz.success_percentage,
+        "description": Quiz.description,
+        "duration": Quiz.duration,
+        "created_by_id": Quiz.created_by_id,
+        "status": Quiz.status,
+    }
+    if "number_of_questions" in fields:
+        # Counted for the quizzes of the page only
+        columns["number_of_questions"] = (
+            db.select(func.count(Question.id))
+            .where(Question.quiz_id == Quiz.id)
+            .scalar_subquery()
+        )
 
-    quizzes = Quiz.query.filter_by(created_by_id=current_user.id)
+    quizzes = db.select(
+        *(columns[field].label(field) for field in dict.fromkeys(["id", *fields]))
+    ).where(Quiz.created_by_id == current_user.id)
+    if "subject_title" in fields:
+        quizzes = quizzes.join(Subject, Subject.id == Quiz.subject_id)
 
+    rank = None
     if search_query:
-        # escape any single or double quotes in the search query
-        search_query = search_query.replace("'", "").replace('"', "")
-        quizzes = quizzes.filter(
-            Quiz.title.ilike(f"%{search_query}%")
-            | Quiz.description.ilike(f"%{search_query}%")
-        )
+        # Most relevant first
+        quizzes, rank = search(quizzes, Quiz, search_query)
 
     if subject_id:
-        quizzes = quizzes.filter_by(
-            created_by_id=current_user.id, subject_id=subject_id
-        )
+        quizzes = quizzes.where(Quiz.subject_id == subject_id)
 
-    quizzes_data = [
-        {
-            "id": q.id,
-            "subject_id": q.subject_id,
-            "subject_title": q.subject.title,
-            "title": q.title,
-            "success_percentage": q.success_percentage,
-            "description": q.description,
-            "duration": q.duration,
-            "created_by_id": q.created_by_id,
-            "number_of_questions": len(q.questions),
-        }
-        for q in quizzes.all()
-    ]
-    return jsonify(quizzes_data)
+    try:
+        rows, next_cursor = page.fetch(quizzes, Quiz.id, rank)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return list_response(rows, fields, next_cursor)
 
 
 # Get Quiz
@@ -216,6 +363,8 @@ def get_quiz(quiz_id):
             "success_percentage": quiz.success_percentage,
             "description": quiz.description,
             "duration": quiz.duration,
+            # Questions of a quiz that is still "generating" are served as they are saved
+            "status": quiz.status,
             "questions": [
                 {
                     "id": q.id,
@@ -268,39 +417,60 @@ def create_quiz_attempt(quiz_id):
     answered_questions = data.get("answered_questions")
 
     quiz = Quiz.query.get_or_404(quiz_id)
-    quiz_attempt = QuizAttempt(quiz_id=quiz.id, result=0, did_pass=False)
-
+    # Questions of a generating quiz may still be added or replaced
+    if quiz.status == "generating":
+        return jsonify({"error": "The quiz is still being generated"}), 409
+
+    # Answer key of the quiz, read with a single query: the choices are checked and scored in
+    # memory, however many questions the quiz has
+    question_ids = set()
+    answer_key = {}
+    for question_id, answer_id, is_correct in db.session.execute(
+        db.select(Question.id, Answer.id, Answer.is_correct)
+        .outerjoin(Answer, Answer.question_id == Question.id)
+        .where(Question.quiz_id == quiz.id)
+    ):
+        question_ids.add(question_id)
+        if answer_id is not None:
+            answer_key[answer_id] = (question_id, is_correct)
+    # Nothing to score, e.g. a quiz whose generation failed before any question was saved
+    if not question_ids:
+        return jsonify({"error": "The quiz has no questions"}), 409
+
+    choices = []
     total_correct = 0
     for q in answered_questions:
         question_id = q["question_id"]
         choice_id = q["choice_id"]
 
-        question = Question.query.get_or_404(question_id)
-        answer = None
-        # If time runs out, user may not answer all questions, so answer may be None
-        if choice_id:
-            answer = Answer.query.get_or_404(choice_id)
+        if question_id not in question_ids:
+            abort(404)
 
-        if not answer:
-            quiz_attempt.answered_questions.append(
-                UserChoice(question_id=question.id, choice_id=None)
-            )
-        else:
-            if answer.question_id != question.id:
+        # If time runs out, user may not answer all questions, so choice may be None
+        if choice_id:
+            if choice_id not in answer_key:
+                abort(404)
+            answer_question_id, is_correct = answer_key[choice_id]
+            if answer_question_id != question_id:
                 return jsonify({"error": "Invalid choice for the question"}), 400
-
-            quiz_attempt.answered_questions.append(
-                UserChoice(question_id=question.id, choice_id=answer.id)
-            )
-
-            if answer.is_correct:
+            if is_correct:
                 total_correct += 1
 
-    quiz_attempt.result = total_correct * 100 // len(quiz.questions)
-
-    quiz_attempt.did_pass = quiz_attempt.result >= quiz.success_percentage
+        choices.append({"question_id": question_id, "choice_id": choice_id or None})
 
+    result = total_correct * 100 // len(question_ids)
+    quiz_attempt = QuizAttempt(
+        quiz_id=quiz.id, result=result, did_pass=result >= quiz.success_percentage
+    )
     db.session.add(quiz_attempt)
+    db.session.flush()
+
+    # A single executemany instead of an INSERT per choice
+    if choices:
+        db.session.execute(
+            insert(UserChoice),
+            [{**choice, "quiz_attempt_id": quiz_attempt.id} for choice in choices],
+        )
     db.session.commit()
 
     return (
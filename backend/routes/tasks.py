@@ -1,19 +1,50 @@
-from flask import Blueprint
-from celery.result import AsyncResult
+from flask import Blueprint, Response, request
+import tasks
+from util.task_events import (
+    MAX_LONG_POLL_WAIT,
+    get_task_status,
+    stream_task_status,
+    wait_for_task_status,
+)
 
 tasks_blueprint = Blueprint("tasks", __name__, url_prefix="/api")
 
 
 @tasks_blueprint.get("/result/<id>")
 def task_result(id: str) -> dict[str, object]:
-    result = AsyncResult(id)
-    response = {
-        "ready": result.ready(),
-        "successful": result.successful(),
-        "value": result.result if result.ready() else None,
-    }
+    """
+    Returns the status of the task. With `wait` (seconds), the request is held until the status
+    is not the one of the `version` the client already has anymore (long polling).
+    """
+    wait = request.args.get("wait", type=float)
+    if not wait or wait <= 0:
+        return get_task_status(id)
 
-    if result.state == "PROGRESS":
-        response["progress"] = result.info
+    return wait_for_task_status(
+        id, request.args.get("version"), min(wait, MAX_LONG_POLL_WAIT)
+    )
 
-    return response
+
+@tasks_blueprint.get("/stream/<id>")
+def task_stream(id: str) -> Response:
+    """
+    Streams the status of the task as server-sent events, one event every time it changes
+    """
+    return Response(
+        stream_task_status(id),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Do not let nginx buffer the events
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@tasks_blueprint.get("/queues")
+def queue_stats() -> dict[str, object]:
+    """
+    Returns the number of quiz generation jobs waiting in each queue, and how long the queue's
+    last jobs waited for a worker
+    """
+    return tasks.scheduler.stats()
@@ -1,14 +1,164 @@
-from celery import shared_task
-from typing import List
-from models import Quiz, Question, Answer
-from app import db
-from util.index import remove_files
-from util.quizgpt.index import QuizGPT
+from celery import shared_task, chord, group, states
+from celery.utils import uuid
+from celery.signals import worker_process_init
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from models import Quiz, Question
+from app import db, app, celery_app
+from util.blob_leases import BlobLeases
+from util.blob_store import create_blob_store
+from util.importing import copy_questions, delete_questions, insert_questions
+from util.scheduler import JobScheduler
+from util.single_flight import FOLLOWING_STATE, SingleFlight, flight_key
+from util.quizgpt.index import PROMPT_VERSION, QuizGPT, Question as GeneratedQuestion
+from util.quizgpt.document_cache import DocumentCache
+from util.quizgpt.response_cache import RedisResponseCache
+from util.quizgpt.rate_limit import RateLimiter
+from util.quizgpt.clients import init_clients
+from redis import Redis
 
+# Shared by the process' tasks, the Redis connections are only opened when first used
+response_cache = RedisResponseCache(
+    Redis.from_url(app.config["RESPONSE_CACHE_URL"]),
+    ttl=app.config["RESPONSE_CACHE_TTL"],
+    max_entries=app.config["RESPONSE_CACHE_MAX_ENTRIES"],
+)
+blob_store = create_blob_store(app.config)
+blob_leases = BlobLeases(
+    Redis.from_url(app.config["SCHEDULER_URL"]),
+    lease_duration=app.config["BLOB_LEASE_DURATION"],
+    retention=app.config["BLOB_RETENTION"],
+)
+document_cache = DocumentCache(
+    app.config["DOCUMENT_CACHE_FOLDER"],
+    max_size=app.config["DOCUMENT_CACHE_MAX_SIZE"],
+)
+rate_limiter = RateLimiter(
+    Redis.from_url(app.config["RATE_LIMITER_URL"]),
+    requests_per_minute=app.config["OPENAI_REQUESTS_PER_MINUTE"],
+    tokens_per_minute=app.config["OPENAI_TOKENS_PER_MINUTE"],
+)
+scheduler = JobScheduler(
+    Redis.from_url(app.config["SCHEDULER_URL"]),
+    class_max_costs=(
+        app.config["QUIZ_QUEUE_SMALL_MAX_QUESTIONS"],
+        app.config["QUIZ_QUEUE_MEDIUM_MAX_QUESTIONS"],
+    ),
+    quantum=app.config["QUIZ_SCHEDULER_QUANTUM"],
+)
+flights = SingleFlight(
+    Redis.from_url(app.config["SCHEDULER_URL"]),
+    max_flight_duration=app.config["QUIZ_SINGLE_FLIGHT_MAX_DURATION"],
+    ttl=app.config["RESPONSE_CACHE_TTL"],
+    max_queue_duration=app.config["QUIZ_SINGLE_FLIGHT_MAX_QUEUE_DURATION"],
+)
 
-@shared_task(bind=True, ignore_result=False)
-def create_quiz(
-    self,
+# Seconds the shared state of a quiz generation job is kept in Redis
+JOB_STATE_TTL = 24 * 60 * 60
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """
+    Creates the worker process' GPT clients before it runs its first task, so the tasks do not
+    pay for building them
+    """
+    clients = init_clients(
+        max_connections=app.config["OPENAI_MAX_CONNECTIONS"],
+        base_url=app.config["OPENAI_BASE_URL"],
+    )
+    QuizGPT.warm_up(clients)
+
+
+def job_key(job_id: str, name: str) -> str:
+    """
+    Redis key of a quiz generation job's shared state, kept in the result backend's Redis
+    """
+    return f"quizgpt:jobs:{job_id}:{name}"
+
+
+def create_quiz_gpt(job: dict, **kwargs) -> QuizGPT:
+    """
+    QuizGPT generating the questions of segments split by the job's planning task
+    """
+    return QuizGPT(
+        files=[],
+        language=job["language"],
+        max_concurrency=app.config["QUIZGPT_MAX_CONCURRENCY"],
+        batch_size=app.config["QUIZGPT_BATCH_SIZE"],
+        max_segment_tokens=app.config["QUIZGPT_MAX_SEGMENT_TOKENS"],
+        response_cache=response_cache,
+        rate_limiter=rate_limiter,
+        **kwargs,
+    )
+
+
+def save_questions(quiz_id: int, questions: List[Tuple[int, GeneratedQuestion]]):
+    """
+    Saves the questions generated from the segments at their positions in a single transaction,
+    replacing the segments' previous questions. Unsuccessful questions only remove the previous
+    questions.
+    """
+    delete_questions(quiz_id, positions=[position for position, _ in questions])
+    insert_questions(
+        quiz_id,
+        [
+            {"position": position, **q.dict(include={"title", "answers"})}
+            for position, q in questions
+            if q.success and q.title
+        ],
+    )
+    db.session.commit()
+
+
+def report_progress(
+    task, job: dict, stage: str, current: int, total: int, saved_questions: int
+):
+    """
+    Reports the progress of the job's current stage as the progress of the job's task, along with
+    the number of questions of the quiz saved so far (tracked by the caller, so no query is made)
+    """
+    # `current` and `total` are the number of saved questions and of requested questions
+    task.update_state(
+        task_id=job["job_id"],
+        state="PROGRESS",
+        meta={
+            "current": saved_questions,
+            "total": job["number_of_questions"],
+            "quiz_id": job["quiz_id"],
+            "stage": stage,
+            "stage_current": current,
+            "stage_total": total,
+        },
+    )
+
+
+def fail_quiz(quiz_id: int):
+    """
+    Cleans up after a quiz generation job that failed. The questions that were already saved are
+    kept, the quiz can still be served without the missing ones.
+    """
+    # Called by both the failed task and the job's error callback
+    db.session.rollback()
+    quiz = db.session.get(Quiz, quiz_id)
+    if quiz is None or quiz.status != "generating":
+        return
+
+    if quiz.questions:
+        quiz.status = "failed"
+    else:
+        db.session.delete(quiz)
+    db.session.commit()
+
+
+def queue_name(queue_class: str) -> str:
+    """
+    Celery queue of the quiz generation jobs of a class
+    """
+    return f"quizzes.{queue_class}"
+
+
+def enqueue_quiz(
     user_id: int,
     subject_id: int,
     title: str,
@@ -16,8 +166,174 @@ def create_quiz(
     description: str,
     duration: int,
     number_of_questions: int,
-    created_files_paths: List[str],
+    blob_names: List[str],
+    language: Optional[str] = None,
+) -> str:
+    """
+    Queues the generation of a quiz, unless the same questions are already being generated or
+    were generated recently (same files, number of questions, language and prompts), in which
+    case the quiz is a copy of their quiz. Returns the id of the job, which is the id of its task
+    result.
+
+    The blobs must be leased for the job (see `BlobLeases`), the job releases them.
+    """
+    request = {
+        "user_id": user_id,
+        "subject_id": subject_id,
+        "title": title,
+        "success_percentage": success_percentage,
+        "description": description,
+        "duration": duration,
+        "number_of_questions": number_of_questions,
+        "blob_names": blob_names,
+    }
+    flight = flight_key(blob_names, number_of_questions, language, PROMPT_VERSION)
+    return submit_quiz_job(flight, uuid(), request)
+
+
+def submit_quiz_job(flight: str, job_id: str, request: dict) -> str:
+    """
+    Submits the quiz generation job of the request to its flight, see `enqueue_quiz`
+    """
+    result = flights.landed_result(flight)
+    if result is not None:
+        if copy_quiz_result(result, job_id, request):
+            blob_leases.release(request["blob_names"])
+            return job_id
+        # The quiz was deleted since
+        flights.forget(flight)
+
+    # Until it gets its result, a follower's job reports the progress of the flight's leader (see
+    # `get_task_status`). Stored before joining, so it never replaces the result of a leader that
+    # lands right after.
+    celery_app.backend.store_result(job_id, {"flight": flight}, FOLLOWING_STATE)
+    leader_id, attached = flights.join(flight, job_id, request)
+    if attached:
+        # e.g. the same form submitted twice, the leader's job holds its own leases
+        blob_leases.release(request["blob_names"])
+        celery_app.backend.forget(job_id)
+        return leader_id
+    if leader_id is not None:
+        # The job gets its result once the leader's job is done
+        return job_id
+    celery_app.backend.forget(job_id)
+
+    # Queued behind the user's other jobs of the same class, the job's number of questions is its
+    # estimated cost
+    queue_class = scheduler.queue_class(request["number_of_questions"])
+    scheduler.push(
+        queue_class,
+        request["user_id"],
+        job_id,
+        request["number_of_questions"],
+        {"job_id": job_id, "flight": flight, "quiz": request},
+    )
+    run_next_quiz.apply_async((queue_class,), queue=queue_name(queue_class))
+    return job_id
+
+
+def copy_quiz_result(result: dict, job_id: str, request: dict) -> bool:
+    """
+    Stores the result of a job of the same flight as the job's result, with a copy of the job's
+    quiz created for the request. Returns `False` if the quiz does not exist anymore.
+    """
+    source = db.session.get(Quiz, result["quiz_id"])
+    if source is None or source.status != "ready":
+        return False
+
+    quiz = Quiz(
+        subject_id=request["subject_id"],
+        title=request["title"],
+        success_percentage=request["success_percentage"],
+        description=request["description"],
+        duration=request["duration"],
+        created_by_id=request["user_id"],
+        status="ready",
+    )
+    db.session.add(quiz)
+    db.session.flush()
+    copy_questions(source.id, quiz.id)
+    db.session.commit()
+
+    # No GPT request was made for this job
+    result = {
+        **result,
+        "quiz_id": quiz.id,
+        "details": {**result["details"], "gpt_requests": 0},
+    }
+    celery_app.backend.store_result(job_id, result, states.SUCCESS)
+    return True
+
+
+def land_flight(job: dict, result: Optional[dict]):
+    """
+    Ends the flight of a job once it is done (`result` is `None` if it failed). Its followers get
+    a copy of its result, or are submitted again if it failed.
+    """
+    # A job without quiz (e.g. every GPT request failed) is not remembered, nor copied: the error
+    # may be temporary, the same request must be able to generate the quiz later on
+    if result is not None and result["quiz_id"] is None:
+        result = None
+    for follower_id, request in flights.land(job["flight"], job["job_id"], result):
+        if result is not None and copy_quiz_result(result, follower_id, request):
+            blob_leases.release(request["blob_names"])
+        else:
+            submit_quiz_job(job["flight"], follower_id, request)
+
+
+@shared_task(bind=True)
+def run_next_quiz(self, queue_class: str):
+    """
+    Starts the quiz generation job of the class the scheduler picks. Every queued job sends one
+    of these tasks, which one of the class' jobs it runs is only decided once a worker is free.
+    """
+    job = scheduler.pop(queue_class)
+    if job is None:
+        return
+
+    payload, _ = job
+    job_id = payload["job_id"]
+    # The flight lasted as long as a job may wait in its queue, it now lasts as long as a job may
+    # run
+    flights.start(payload["flight"], job_id)
+    try:
+        workflow = plan_quiz(
+            self, job_id, queue_name(queue_class), payload["flight"], **payload["quiz"]
+        )
+    except Exception as e:
+        # The job's result is not this task's result
+        self.backend.mark_as_failure(job_id, Exception(e))
+        land_flight({"job_id": job_id, "flight": payload["flight"]}, None)
+        raise Exception(e)
+    finally:
+        # The files are parsed, the rest of the job only needs their segments
+        blob_leases.release(payload["quiz"]["blob_names"])
+
+    # The chord's callback keeps the job's id, so its result is the result of the whole job
+    workflow.apply_async(task_id=job_id)
+
+
+def plan_quiz(
+    task,
+    job_id: str,
+    queue: str,
+    flight: str,
+    user_id: int,
+    subject_id: int,
+    title: str,
+    success_percentage: int,
+    description: str,
+    duration: int,
+    number_of_questions: int,
+    blob_names: List[str],
 ):
+    """
+    Plans the generation of the quiz: fetches the uploaded files from the blob store, parses them
+    and splits their content into segments.
+    Returns a chord generating the questions of the segments on any worker of the queue, whose
+    callback completes and saves the quiz.
+    """
+    # The quiz is saved right away, its questions are saved as soon as they are generated
     quiz = Quiz(
         subject_id=subject_id,
         title=title,
@@ -25,52 +341,254 @@ def create_quiz(
         description=description,
         duration=duration,
         created_by_id=user_id,
+        status="generating",
+        generation_started_at=datetime.utcnow(),
     )
+    db.session.add(quiz)
+    db.session.commit()
+
+    job = {
+        "job_id": job_id,
+        "flight": flight,
+        "quiz_id": quiz.id,
+        "number_of_questions": number_of_questions,
+    }
+
+    # No question is saved before the segment tasks run
+    def on_progress(stage: str, current: int, total: int):
+        report_progress(task, job, stage, current, total, 0)
 
     try:
-        quiz_gpt = QuizGPT(files=created_files_paths)
-        questions, response_code, response_message = quiz_gpt.generate_questions(
-            num_questions=number_of_questions
-        )
+        on_progress("parsing", 0, len(blob_names))
+        with blob_store.local_paths(blob_names) as files:
+            quiz_gpt = QuizGPT(
+                files=files,
+                max_segment_tokens=app.config["QUIZGPT_MAX_SEGMENT_TOKENS"],
+                document_cache=document_cache,
+                on_progress=on_progress,
+            )
+        try:
+            texts = quiz_gpt.segment_texts(number_of_questions)
+        finally:
+            quiz_gpt.close()
+    except Exception:
+        fail_quiz(quiz.id)
+        raise
+
+    job["language"] = quiz_gpt.language
+    job["total_segments"] = len(texts)
+    on_progress("generation", 0, len(texts))
+
+    # Each task generates the questions of the segments of a single (batched) GPT request
+    batch_size = app.config["QUIZGPT_BATCH_SIZE"]
+    header = group(
+        generate_quiz_questions.s(job, i, texts[i : i + batch_size]).set(queue=queue)
+        for i in range(0, len(texts), batch_size)
+    )
+    callback = (
+        finalize_quiz.s(job, texts, quiz_gpt.token_usage)
+        .set(queue=queue)
+        .on_error(abort_quiz.si(job).set(queue=queue))
+    )
+    return chord(header, callback)
+
+
+@shared_task(bind=True, ignore_result=False)
+def generate_quiz_questions(self, job: dict, first_index: int, texts: List[str]):
+    """
+    Generates the questions of adjacent segments of a quiz generation job, and saves them as soon
+    as they are generated
+    """
+    redis = celery_app.backend.client
+    # Another segment was too short, so this one is as well
+    if redis.exists(job_key(job["job_id"], "too-short")):
+        return {"questions": None, "gpt_requests": 0}
+
+    quiz_gpt = create_quiz_gpt(job)
+    try:
+        questions = quiz_gpt.generate_segment_questions(texts, first_index)
+    finally:
+        quiz_gpt.close()
+
+    if questions is None:
+        # Let the segment tasks that did not start yet skip their segments
+        redis.set(job_key(job["job_id"], "too-short"), 1, ex=JOB_STATE_TTL)
+        return {"questions": None, "gpt_requests": quiz_gpt.request_count}
+
+    # The questions of a batch all arrive with the same GPT response
+    save_questions(job["quiz_id"], list(enumerate(questions, first_index)))
+
+    # The positions of the saved questions are counted in a set, so a task that runs again does
+    # not count its questions twice
+    saved_positions = [
+        position
+        for position, q in enumerate(questions, first_index)
+        if q.success and q.title
+    ]
+    with redis.pipeline() as pipe:
+        pipe.incrby(job_key(job["job_id"], "generated"), len(texts))
+        pipe.expire(job_key(job["job_id"], "generated"), JOB_STATE_TTL)
+        if saved_positions:
+            pipe.sadd(job_key(job["job_id"], "saved"), *saved_positions)
+            pipe.expire(job_key(job["job_id"], "saved"), JOB_STATE_TTL)
+        pipe.scard(job_key(job["job_id"], "saved"))
+        results = pipe.execute()
+    report_progress(
+        self, job, "generation", results[0], job["total_segments"], results[-1]
+    )
+
+    return {
+        "questions": [q.dict() for q in questions],
+        "gpt_requests": quiz_gpt.request_count,
+    }
+
+
+@shared_task(bind=True, ignore_result=False)
+def finalize_quiz(
+    self,
+    results: List[dict],
+    job: dict,
+    texts: List[str],
+    token_usage: dict,
+):
+    """
+    Completes the questions generated by the segment tasks (regenerating the unsuccessful and
+    duplicate ones) and finishes the quiz
+    """
+    quiz = db.session.get(Quiz, job["quiz_id"])
+    gpt_requests = sum(r["gpt_requests"] for r in results)
+
+    try:
+        # If the question could not generate due to content being too short, every segment is
+        # too short, see `QuizGPT.generate_questions`
+        if any(r["questions"] is None for r in results):
+            questions, response_code, response_message = (
+                [],
+                "too-short",
+                "The provided content is too short to generate questions.",
+            )
+        else:
+            # Read once, then kept up to date as the regenerated questions are saved
+            saved_positions = set(
+                db.session.scalars(
+                    db.select(Question.position).where(Question.quiz_id == quiz.id)
+                )
+            )
+
+            def on_question(position: int, q: GeneratedQuestion):
+                save_questions(quiz.id, [(position, q)])
+                if q.success and q.title:
+                    saved_positions.add(position)
+                else:
+                    saved_positions.discard(position)
+
+            quiz_gpt = create_quiz_gpt(
+                job,
+                on_progress=lambda stage, current, total: report_progress(
+                    self, job, stage, current, total, len(saved_positions)
+                ),
+                on_question=on_question,
+            )
+            try:
+                questions, response_code, response_message = (
+                    quiz_gpt.complete_questions(
+                        [
+                            GeneratedQuestion(**q)
+                            for r in results
+                            for q in r["questions"]
+                        ],
+                        texts,
+                    )
+                )
+            finally:
+                quiz_gpt.close()
+            gpt_requests += quiz_gpt.request_count
 
         # If no questions were generated
         if len(questions) <= 0:
-            remove_files(created_files_paths)
-            return {
+            db.session.delete(quiz)
+            db.session.commit()
+            result = {
                 "message": "Error during quiz creation",
                 "quiz_id": None,
                 "details": {
                     "response_message": response_message,
                     "response_code": response_code,
+                    "gpt_requests": gpt_requests,
+                    "token_usage": token_usage,
                 },
             }
+        else:
+            quiz.status = "ready"
+            db.session.commit()
 
-        # Save the questions and answers to the database
-        for i, q in enumerate(questions):
-            question = Question(title=q.title)
-            for a in q.answers:
-                answer = Answer(title=a.title, is_correct=a.is_correct)
-                question.answers.append(answer)
-            quiz.questions.append(question)
-
-            # Update task progress
-            self.update_state(
-                state="PROGRESS", meta={"current": i + 1, "total": len(questions)}
-            )
-
-        db.session.add(quiz)
-        db.session.commit()
-        remove_files(created_files_paths)
-
-        return {
-            "message": "Quiz created successfully.",
-            "quiz_id": quiz.id,
-            "details": {
-                "response_message": response_message,
-                "response_code": response_code,
-            },
-        }
+            result = {
+                "message": "Quiz created successfully.",
+                "quiz_id": quiz.id,
+                "details": {
+                    "response_message": response_message,
+                    "response_code": response_code,
+                    "gpt_requests": gpt_requests,
+                    "token_usage": token_usage,
+                },
+            }
 
     except Exception as e:
-        remove_files(created_files_paths)
+        fail_quiz(job["quiz_id"])
         raise Exception(e)
+    finally:
+        celery_app.backend.client.delete(
+            job_key(job["job_id"], "generated"),
+            job_key(job["job_id"], "saved"),
+            job_key(job["job_id"], "too-short"),
+        )
+
+    # The jobs of the same flight get a copy of the quiz
+    land_flight(job, result)
+    return result
+
+
+@shared_task
+def abort_quiz(job: dict):
+    """
+    Error callback of a quiz generation job, cleans up when one of its tasks failed
+    """
+    fail_quiz(job["quiz_id"])
+    land_flight(job, None)
+
+
+@shared_task
+def collect_blobs():
+    """
+    Periodic task deleting the stored files no quiz generation job used during the retention
+    period, see `BlobLeases`
+    """
+    while True:
+        names = blob_leases.collect()
+        for name in names:
+            try:
+                blob_store.delete(name)
+            finally:
+                blob_leases.deleted(name)
+        if not names:
+            break
+
+
+@shared_task
+def fail_stale_quizzes():
+    """
+    Periodic task failing the quizzes still generating `QUIZ_GENERATION_TIMEOUT` seconds after
+    their generation started, whose job was lost (e.g. its worker was killed) and will never
+    complete them
+    """
+    started_before = datetime.utcnow() - timedelta(
+        seconds=app.config["QUIZ_GENERATION_TIMEOUT"]
+    )
+    quiz_ids = db.session.scalars(
+        db.select(Quiz.id).where(
+            Quiz.status == "generating",
+            Quiz.generation_started_at < started_before,
+        )
+    ).all()
+    for quiz_id in quiz_ids:
+        fail_quiz(quiz_id)
@@ -0,0 +1,92 @@
+import io
+import time
+import hashlib
+import threading
+import pytest
+from util.blob_leases import BlobLeases
+from util.blob_store import FileSystemBlobStore
+
+fakeredis = pytest.importorskip("fakeredis")
+
+CONTENT = b"%PDF-1.4 blob"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def leases():
+    # No retention, so a released blob can be collected right away
+    return BlobLeases(
+        fakeredis.FakeRedis(), lease_duration=60, retention=0, poll_interval=0.01
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FileSystemBlobStore(str(tmp_path))
+
+
+def upload(leases: BlobLeases, store: FileSystemBlobStore) -> str:
+    """
+    Stores the blob the way an upload does: leased before it is stored
+    """
+    name = f"{SHA256}.pdf"
+    leases.acquire([name])
+    return store.store(io.BytesIO(CONTENT), SHA256, "pdf")
+
+
+def test_released_blob_is_collected(leases, store):
+    name = upload(leases, store)
+    assert leases.collect() == []
+
+    leases.release([name])
+    assert leases.collect() == [name]
+    assert leases.collect() == []
+
+
+def test_acquire_before_collect_keeps_blob(leases, store):
+    name = upload(leases, store)
+    leases.release([name])
+
+    leases.acquire([name])
+    assert leases.collect() == []
+    assert store.exists(name)
+
+
+def test_acquire_during_deletion_stores_blob_again(leases, store):
+    name = upload(leases, store)
+    leases.release([name])
+    assert leases.collect() == [name]
+
+    # An upload of the same file between the collection and the deletion of its blob
+    uploaded = threading.Event()
+    thread = threading.Thread(target=lambda: (upload(leases, store), uploaded.set()))
+    thread.start()
+    time.sleep(0.1)
+    assert not uploaded.is_set()
+
+    store.delete(name)
+    leases.deleted(name)
+    thread.join(timeout=5)
+    assert uploaded.is_set()
+    assert store.exists(name)
+    # Leased by the upload, so not collected again
+    assert leases.collect() == []
+
+
+def test_unfinished_deletion_times_out(store):
+    leases = BlobLeases(
+        fakeredis.FakeRedis(),
+        lease_duration=60,
+        retention=0,
+        deletion_timeout=1,
+        poll_interval=0.01,
+    )
+    name = upload(leases, store)
+    leases.release([name])
+    assert leases.collect() == [name]
+
+    # The collector was killed before it deleted the blob
+    start = time.monotonic()
+    upload(leases, store)
+    assert time.monotonic() - start < 5
+    assert store.exists(name)
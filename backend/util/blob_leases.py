@@ -0,0 +1,146 @@
+import time
+from typing import List
+from redis import Redis
+
+# Leases the blobs for a job: counts the job among the jobs using each blob. A lease of a job
+# that never released it (e.g. its worker was killed) expires, its blob can then be deleted once
+# the retention is over. Returns the blobs being deleted, which the job must wait for.
+#
+# KEYS: unused blobs, jobs counter of each blob, deleting marker of each blob
+# ARGV: now, seconds a lease lasts, seconds an unused blob is kept, name of each blob
+ACQUIRE_SCRIPT = """
+local count = (#KEYS - 1) / 2
+local deletable_at = tonumber(ARGV[1]) + tonumber(ARGV[2]) + tonumber(ARGV[3])
+local deleting = {}
+for i = 1, count do
+    redis.call('INCR', KEYS[i + 1])
+    redis.call('EXPIRE', KEYS[i + 1], ARGV[2])
+    redis.call('ZADD', KEYS[1], deletable_at, ARGV[i + 3])
+    if redis.call('EXISTS', KEYS[i + 1 + count]) == 1 then
+        table.insert(deleting, ARGV[i + 3])
+    end
+end
+return deleting
+"""
+
+# Releases the blobs of a job, a blob no other job uses can be deleted once the retention is over
+#
+# KEYS: unused blobs, jobs counter of each blob
+# ARGV: now, seconds an unused blob is kept, name of each blob
+RELEASE_SCRIPT = """
+for i = 2, #KEYS do
+    if redis.call('DECR', KEYS[i]) <= 0 then
+        redis.call('DEL', KEYS[i])
+        redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[2]), ARGV[i + 1])
+    end
+end
+return 1
+"""
+
+# Returns the blobs no job used during the retention, and forgets them. They are marked as being
+# deleted until the caller deleted them, a job leasing one meanwhile waits for its deletion.
+#
+# KEYS: unused blobs
+# ARGV: now, key prefix of the blobs, maximum number of blobs returned, seconds a marker lasts
+COLLECT_SCRIPT = """
+local names = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+local collected = {}
+for _, name in ipairs(names) do
+    if redis.call('EXISTS', ARGV[2] .. name .. ':jobs') == 0 then
+        redis.call('ZREM', KEYS[1], name)
+        redis.call('SET', ARGV[2] .. name .. ':deleting', 1, 'EX', ARGV[4])
+        table.insert(collected, name)
+    end
+end
+return collected
+"""
+
+
+class BlobLeases:
+    """
+    Tracks which blobs of the blob store the quiz generation jobs still need, shared by every web
+    and worker node through Redis. A job leases its blobs before they are stored and releases them
+    once they were parsed, a blob that is not leased for the retention period can be deleted (the
+    retention lets the same file uploaded again reuse the stored blob and its parsed document).
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        lease_duration: int,
+        retention: int,
+        prefix: str = "quizgpt:blobs",
+        deletion_timeout: int = 60,
+        poll_interval: float = 0.1,
+    ) -> None:
+        self.redis = redis
+        # Seconds after which the lease of a job that never released it expires
+        self.lease_duration = lease_duration
+        # Seconds a blob no job uses is kept
+        self.retention = retention
+        # Seconds after which a blob whose deletion never finished (e.g. the collector was killed)
+        # stops being waited for
+        self.deletion_timeout = deletion_timeout
+        # Seconds between the checks of a job waiting for the deletion of its blobs
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+        self._collect = redis.register_script(COLLECT_SCRIPT)
+
+    def _jobs_key(self, name: str) -> str:
+        return f"{self.prefix}:{name}:jobs"
+
+    def _deleting_key(self, name: str) -> str:
+        return f"{self.prefix}:{name}:deleting"
+
+    def acquire(self, names: List[str]) -> None:
+        """
+        Leases the blobs for a job, they are not deleted until the job releases them. Returns once
+        none of them is being deleted anymore, so a blob deleted meanwhile is known to be missing
+        (and is stored again) rather than deleted after it was found stored.
+        """
+        if not names:
+            return
+        deleting = self._acquire(
+            keys=[f"{self.prefix}:unused"]
+            + [self._jobs_key(n) for n in names]
+            + [self._deleting_key(n) for n in names],
+            args=[time.time(), self.lease_duration, self.retention] + names,
+        )
+        # The leases keep the blobs from being collected again, only the deletions already
+        # started are waited for
+        while deleting and self.redis.exists(
+            *[self._deleting_key(n.decode()) for n in deleting]
+        ):
+            time.sleep(self.poll_interval)
+
+    def release(self, names: List[str]) -> None:
+        """
+        Releases the blobs a job leased
+        """
+        if names:
+            self._release(
+                keys=[f"{self.prefix}:unused"] + [self._jobs_key(n) for n in names],
+                args=[time.time(), self.retention] + names,
+            )
+
+    def collect(self, limit: int = 1000) -> List[str]:
+        """
+        Returns (at most `limit` of) the blobs that were not leased during the retention period,
+        which the caller deletes then reports with `deleted`. They are not returned again.
+        """
+        return [
+            name.decode()
+            for name in self._collect(
+                keys=[f"{self.prefix}:unused"],
+                args=[time.time(), f"{self.prefix}:", limit, self.deletion_timeout],
+            )
+        ]
+
+    def deleted(self, name: str) -> None:
+        """
+        Reports that a blob returned by `collect` was deleted, the jobs that leased it meanwhile
+        stop waiting
+        """
+        self.redis.delete(self._deleting_key(name))
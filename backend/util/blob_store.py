@@ -0,0 +1,195 @@
+import os
+import shutil
+import hashlib
+from abc import ABC, abstractmethod
+from contextlib import ExitStack, contextmanager
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, ContextManager, Iterator, List, Optional
+
+# Size of the chunks files are hashed, written and uploaded in
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_name(sha256: str, extension: str) -> str:
+    """
+    Name of a blob, its content's SHA-256 and the extension it was uploaded with (the extension
+    is used to pick the file's loader)
+    """
+    return f"{sha256}.{extension}"
+
+
+class BlobStore(ABC):
+    """
+    Content addressed store of the uploaded files. A file is stored once, however many times it is
+    uploaded, and can be fetched by any web or worker node from its name.
+    """
+
+    @abstractmethod
+    def exists(self, name: str) -> bool: ...
+
+    @abstractmethod
+    def put(self, file: BinaryIO, name: str) -> None:
+        """
+        Stores the content of the file, read from its current position in chunks
+        """
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """
+        Deletes the blob, if it exists
+        """
+
+    @abstractmethod
+    def local_path(self, name: str) -> ContextManager[str]:
+        """
+        Returns the path of a local file holding the blob's content, valid until the context exits
+        """
+
+    def store(self, file: BinaryIO, sha256: str, extension: str) -> str:
+        """
+        Stores the file whose content's SHA-256 is already known unless it is already stored,
+        returns its blob name
+        """
+        name = blob_name(sha256, extension)
+        if not self.exists(name):
+            self.put(file, name)
+        return name
+
+    def store_file(self, path: str) -> str:
+        """
+        Stores a local file unless it is already stored, returns its blob name
+        """
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+            f.seek(0)
+            return self.store(f, sha256.hexdigest(), path.rsplit(".", 1)[1].lower())
+
+    @contextmanager
+    def local_paths(self, names: List[str]) -> Iterator[List[str]]:
+        """
+        `local_path` of multiple blobs
+        """
+        with ExitStack() as stack:
+            yield [stack.enter_context(self.local_path(name)) for name in names]
+
+
+class FileSystemBlobStore(BlobStore):
+    """
+    Blobs stored in a local folder, which must be shared by the web and worker nodes
+    """
+
+    def __init__(self, folder: str) -> None:
+        # Created with the first blob's sub folder, see `put`
+        self.folder = folder
+
+    def _path(self, name: str) -> str:
+        # Spread over sub folders, so no folder holds too many files
+        return os.path.join(self.folder, name[:2], name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def put(self, file: BinaryIO, name: str) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name, so a partially written blob is never visible
+        with NamedTemporaryFile(
+            dir=os.path.dirname(path), suffix=".tmp", delete=False
+        ) as f:
+            try:
+                shutil.copyfileobj(file, f, CHUNK_SIZE)
+            except BaseException:
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def local_path(self, name: str) -> Iterator[str]:
+        path = self._path(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Blob {name} does not exist")
+        yield path
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs stored in an S3 compatible bucket (e.g. a MinIO server), which any node can fetch them
+    from. Requires `boto3`.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        region: Optional[str] = None,
+        prefix: str = "uploads/",
+    ) -> None:
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise ImportError(
+                "The S3 blob store requires boto3, run `pip install boto3`"
+            )
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client_error = ClientError
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region,
+        )
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + name)
+        except self._client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def put(self, file: BinaryIO, name: str) -> None:
+        # Uploaded in parts, without reading the whole file in memory
+        self.client.upload_fileobj(file, self.bucket, self.prefix + name)
+
+    def delete(self, name: str) -> None:
+        # Deleting a missing object is not an error
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+
+    @contextmanager
+    def local_path(self, name: str) -> Iterator[str]:
+        with NamedTemporaryFile(suffix="." + name.rsplit(".", 1)[1]) as f:
+            self.client.download_fileobj(self.bucket, self.prefix + name, f)
+            f.flush()
+            yield f.name
+
+
+def create_blob_store(config: dict) -> BlobStore:
+    """
+    Creates the blob store selected by the `BLOB_STORE` setting
+    """
+    if config["BLOB_STORE"] == "s3":
+        return S3BlobStore(
+            config["S3_BUCKET"],
+            endpoint_url=config["S3_ENDPOINT_URL"],
+            access_key_id=config["S3_ACCESS_KEY_ID"],
+            secret_access_key=config["S3_SECRET_ACCESS_KEY"],
+            region=config["S3_REGION"],
+        )
+    if config["BLOB_STORE"] == "filesystem":
+        return FileSystemBlobStore(config["BLOB_STORE_FOLDER"])
+    raise ValueError(f"Unknown blob store: {config['BLOB_STORE']}")
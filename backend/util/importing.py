@@ -0,0 +1,103 @@
+from typing import Iterable, List, Optional
+from sqlalchemy import delete, insert, select
+from app import db
+from models import Answer, Question
+
+
+def insert_questions(quiz_id: int, questions: List[dict]) -> List[int]:
+    """
+    Inserts the questions of a quiz and their answers with two statements: every question with
+    `RETURNING id`, then every answer as a single executemany. Much faster than adding the ORM
+    objects one by one, which makes an INSERT round trip per row.
+
+    Each question is a dictionary with a `title`, an optional `position` and its `answers`, each a
+    dictionary with a `title` and `is_correct`. Returns the ids of the inserted questions, in the
+    same order. The caller commits the transaction.
+    """
+    if not questions:
+        return []
+
+    question_ids = (
+        db.session.execute(
+            insert(Question)
+            .returning(Question.id, sort_by_parameter_order=True)
+            .execution_options(render_nulls=True),
+            [
+                {
+                    "quiz_id": quiz_id,
+                    "title": q["title"],
+                    "position": q.get("position"),
+                }
+                for q in questions
+            ],
+        )
+        .scalars()
+        .all()
+    )
+
+    answers = [
+        {
+            "question_id": question_id,
+            "title": a["title"],
+            "is_correct": a["is_correct"],
+        }
+        for question_id, q in zip(question_ids, questions)
+        for a in q["answers"]
+    ]
+    if answers:
+        db.session.execute(insert(Answer), answers)
+
+    return question_ids
+
+
+def delete_questions(quiz_id: int, positions: Optional[Iterable[int]] = None) -> None:
+    """
+    Deletes the questions of a quiz (only the ones at `positions`, if provided) and their answers.
+    The caller commits the transaction.
+    """
+    conditions = [Question.quiz_id == quiz_id]
+    if positions is not None:
+        conditions.append(Question.position.in_(list(positions)))
+
+    # Bulk deletes skip the ORM cascades, the answers are deleted first
+    db.session.execute(
+        delete(Answer).where(
+            Answer.question_id.in_(select(Question.id).where(*conditions))
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.execute(
+        delete(Question).where(*conditions),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def copy_questions(source_quiz_id: int, quiz_id: int) -> List[int]:
+    """
+    Copies the questions of a quiz and their answers to another quiz, reading them with a single
+    query. Returns the ids of the copies. The caller commits the transaction.
+    """
+    rows = db.session.execute(
+        select(
+            Question.id,
+            Question.title,
+            Question.position,
+            Answer.title,
+            Answer.is_correct,
+        )
+        .outerjoin(Answer, Answer.question_id == Question.id)
+        .where(Question.quiz_id == source_quiz_id)
+        .order_by(Question.position, Question.id, Answer.id)
+    ).all()
+
+    questions = {}
+    for question_id, title, position, answer_title, is_correct in rows:
+        question = questions.setdefault(
+            question_id, {"title": title, "position": position, "answers": []}
+        )
+        if answer_title is not None:
+            question["answers"].append(
+                {"title": answer_title, "is_correct": is_correct}
+            )
+
+    return insert_questions(quiz_id, list(questions.values()))
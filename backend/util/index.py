@@ -1,5 +1,4 @@
-import os
-from typing import List
+import hashlib
 from datetime import datetime
 from sqlalchemy import Column, DateTime, event
 from app import db, app
@@ -45,9 +44,12 @@ def allowed_file(filename: str):
     )
 
 
-def remove_files(files: List[str]):
+def file_sha256(path: str) -> str:
     """
-    Remove files from the file system
+    Get the hex SHA-256 digest of a file's content
     """
-    for file in files:
-        os.remove(file)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
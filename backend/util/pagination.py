@@ -0,0 +1,148 @@
+import json
+import base64
+import binascii
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import ColumnElement, Select, and_, or_
+from sqlalchemy.orm import InstrumentedAttribute
+from app import db
+
+# Number of rows of a page, when no limit is provided
+DEFAULT_PAGE_SIZE = 50
+# Maximum number of rows of a page
+MAX_PAGE_SIZE = 100
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """
+    Returns the fields of a comma separated `fields` query argument, checking they are allowed.
+    Every allowed field when the argument is missing.
+    """
+    if not fields:
+        return list(allowed)
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def encode_cursor(order: str, key) -> str:
+    """
+    Opaque cursor of the page following the row whose sort key is `key`: its id, or its relevance
+    and id for the "relevance" order
+    """
+    return base64.urlsafe_b64encode(json.dumps([order, key]).encode()).decode()
+
+
+def decode_cursor(cursor: str, order: str):
+    """
+    Returns the sort key of the last row of the previous page of a cursor made by
+    `encode_cursor`
+    """
+    try:
+        cursor_order, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_order != order:
+        raise ValueError("Invalid cursor")
+
+    if order == "relevance":
+        valid = (
+            type(key) is list
+            and len(key) == 2
+            and type(key[0]) in (int, float)
+            and type(key[1]) is int
+        )
+    else:
+        valid = type(key) is int
+    if not valid:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+class KeysetPage:
+    """
+    Page of a list ordered by id (or by relevance, then id), starting after the last row of the
+    previous page (keyset pagination). Unlike an offset, the database reads only the rows of the
+    page, through the primary key's index, however far the page is.
+
+    Lists are always split in pages, of `DEFAULT_PAGE_SIZE` rows unless a `limit` is provided.
+    """
+
+    def __init__(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        order: str = "asc",
+    ) -> None:
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"Key 'limit' must be between 1 and {MAX_PAGE_SIZE}")
+        if order not in ("asc", "desc"):
+            raise ValueError("Key 'order' must be 'asc' or 'desc'")
+
+        self.limit = limit
+        self.order = order
+        self.cursor = cursor
+
+    @classmethod
+    def from_args(cls, args: Dict[str, str]) -> "KeysetPage":
+        """
+        Page of the `limit`, `cursor` and `order` query arguments
+        """
+        try:
+            limit = int(args["limit"]) if args.get("limit") else DEFAULT_PAGE_SIZE
+        except ValueError:
+            raise ValueError("Key 'limit' must be an integer")
+        return cls(limit, args.get("cursor"), args.get("order") or "asc")
+
+    def apply(
+        self,
+        query: Select,
+        id_column: InstrumentedAttribute,
+        rank: Optional[ColumnElement] = None,
+    ) -> Select:
+        """
+        Restricts the query to the page's rows, one more row is read to know if there is a next
+        page. Rows with a `rank` (e.g. search results) are ordered by relevance, the most
+        relevant first.
+        """
+        if rank is not None:
+            query = query.order_by(rank.desc(), id_column.asc())
+            if self.cursor:
+                last_rank, last_id = decode_cursor(self.cursor, "relevance")
+                query = query.where(
+                    or_(rank < last_rank, and_(rank == last_rank, id_column > last_id))
+                )
+        elif self.order == "asc":
+            query = query.order_by(id_column.asc())
+            if self.cursor:
+                query = query.where(id_column > decode_cursor(self.cursor, "asc"))
+        else:
+            query = query.order_by(id_column.desc())
+            if self.cursor:
+                query = query.where(id_column < decode_cursor(self.cursor, "desc"))
+
+        return query.limit(self.limit + 1)
+
+    def fetch(
+        self,
+        query: Select,
+        id_column: InstrumentedAttribute,
+        rank: Optional[ColumnElement] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Runs the query of the page, returns its rows and the cursor of the next page (`None` for
+        the last page). Each row must have its `id`.
+        """
+        if rank is not None:
+            # The relevance of the last row is part of the cursor
+            query = query.add_columns(rank.label("rank"))
+        rows = db.session.execute(self.apply(query, id_column, rank)).mappings().all()
+        if len(rows) <= self.limit:
+            return rows, None
+
+        rows = rows[: self.limit]
+        if rank is not None:
+            return rows, encode_cursor("relevance", [rows[-1]["rank"], rows[-1]["id"]])
+        return rows, encode_cursor(self.order, rows[-1]["id"])
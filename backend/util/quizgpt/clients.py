@@ -0,0 +1,95 @@
+from threading import Lock
+from typing import Dict, Optional, Tuple, Type
+import httpx
+import openai
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+
+# Seconds a GPT request may take before it is considered failed (and retried)
+REQUEST_TIMEOUT = 120
+
+
+class GPTClients:
+    """
+    GPT clients of the process. Every client shares a single HTTP connection pool whose
+    connections are kept alive between requests, and the structured output runnables are only
+    built once per schema.
+
+    Retries are disabled on every client, they are handled by `call_with_backoff`. `base_url`
+    points the clients to another OpenAI compatible API than OpenAI's.
+    """
+
+    def __init__(
+        self, max_connections: int = 20, base_url: Optional[str] = None
+    ) -> None:
+        self.base_url = base_url
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=REQUEST_TIMEOUT,
+        )
+        self.openai = openai.OpenAI(
+            base_url=base_url, http_client=self.http_client, max_retries=0
+        )
+        self._chat_models: Dict[str, ChatOpenAI] = {}
+        self._structured_outputs: Dict[Tuple[str, Type], Runnable] = {}
+        self._lock = Lock()
+
+    def chat_model(self, model: str) -> ChatOpenAI:
+        with self._lock:
+            if model not in self._chat_models:
+                self._chat_models[model] = ChatOpenAI(
+                    model=model,
+                    base_url=self.base_url,
+                    max_retries=0,
+                    http_client=self.http_client,
+                )
+            return self._chat_models[model]
+
+    def structured_output(self, model: str, schema: Type) -> Runnable:
+        """
+        Returns the runnable generating `schema` objects with the model
+        """
+        chat_model = self.chat_model(model)
+        with self._lock:
+            if (model, schema) not in self._structured_outputs:
+                self._structured_outputs[(model, schema)] = (
+                    chat_model.with_structured_output(schema)
+                )
+            return self._structured_outputs[(model, schema)]
+
+    def close(self) -> None:
+        self.http_client.close()
+
+
+_clients: Optional[GPTClients] = None
+_clients_lock = Lock()
+
+
+def init_clients(
+    max_connections: int = 20, base_url: Optional[str] = None
+) -> GPTClients:
+    """
+    Creates the process' GPT clients, replacing the previous ones. Meant to be called once per
+    worker process, before it starts running tasks.
+    """
+    global _clients
+    with _clients_lock:
+        if _clients is not None:
+            _clients.close()
+        _clients = GPTClients(max_connections=max_connections, base_url=base_url)
+        return _clients
+
+
+def get_clients() -> GPTClients:
+    """
+    Returns the process' GPT clients, creating them with the default settings if they were
+    not initialized
+    """
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = GPTClients()
+        return _clients
@@ -0,0 +1,105 @@
+import os
+from tempfile import NamedTemporaryFile
+from typing import Optional
+from util.quizgpt.pages import PageFile, PageFileWriter
+
+FILE_EXTENSION = ".pages"
+
+
+class DocumentCache:
+    """
+    On disk cache of parsed documents, keyed by the SHA-256 of the document file's content.
+
+    Each entry is a page file holding the cleaned text of the document's pages and the detected
+    language of the document, if it could be detected when the entry was created. Once the total
+    size of the entries exceeds `max_size` bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, folder: str, max_size: int) -> None:
+        self.folder = folder
+        self.max_size = max_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key + FILE_EXTENSION)
+
+    def get(self, key: str) -> Optional[PageFile]:
+        """
+        Returns the cached pages for the provided key, or `None` if they are not cached
+        """
+        path = self._path(key)
+        try:
+            page_file = PageFile.open(path)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # The modification time is used as the last access time for the LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return page_file
+
+    def create(self) -> PageFileWriter:
+        """
+        Returns a writer for a new entry, the entry is only visible to other processes once
+        it is added with `add`
+        """
+        # Created on the first write, so the processes that only import the cache don't need it
+        os.makedirs(self.folder, exist_ok=True)
+        return PageFileWriter(
+            NamedTemporaryFile(dir=self.folder, suffix=".tmp", delete=False)
+        )
+
+    def add(self, key: str, writer: PageFileWriter) -> None:
+        """
+        Adds a finished entry to the cache, evicting the least recently used entries if the
+        cache grew past its maximum size
+        """
+        os.replace(writer.file.name, self._path(key))
+        self._evict()
+
+    def set_language(self, key: str, language: str) -> None:
+        """
+        Sets the language of an entry created without a language (detected with GPT later on), so
+        it is not detected again. The entry is replaced, the processes reading it keep reading the
+        previous entry.
+        """
+        page_file = self.get(key)
+        if page_file is None:
+            return
+
+        try:
+            writer = self.create()
+            try:
+                for data, length in page_file.compressed_pages():
+                    writer.add_compressed(data, length)
+                writer.finish(language).close()
+            except BaseException:
+                writer.discard()
+                raise
+        finally:
+            page_file.close()
+        self.add(key, writer)
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(FILE_EXTENSION):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        # Remove the least recently used entries first
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -0,0 +1,73 @@
+import re
+import math
+from collections import Counter
+from typing import List
+import numpy as np
+
+# Questions whose TF-IDF cosine similarity is at least this are considered near duplicates
+DUPLICATE_SIMILARITY_THRESHOLD = 0.8
+
+
+def _terms(text: str) -> List[str]:
+    """
+    Word unigrams and bigrams of the text, bigrams keep questions that only share words but
+    ask different things apart
+    """
+    words = re.findall(r"\w+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def similarity_matrix(texts: List[str]) -> np.ndarray:
+    """
+    Returns the `n x n` matrix of the TF-IDF cosine similarities of the texts
+    """
+    documents = [Counter(_terms(text)) for text in texts]
+    document_frequency = Counter(term for counts in documents for term in counts)
+
+    # Terms found in a single text never contribute to a similarity, they only count towards
+    # the norms. Leaving them out of the matrix keeps it small.
+    shared_terms = [t for t, frequency in document_frequency.items() if frequency > 1]
+    columns = {term: i for i, term in enumerate(shared_terms)}
+
+    # Smoothed inverse document frequency
+    idf = {
+        term: math.log((1 + len(texts)) / (1 + frequency)) + 1
+        for term, frequency in document_frequency.items()
+    }
+
+    matrix = np.zeros((len(texts), len(shared_terms)), dtype=np.float32)
+    norms = np.ones(len(texts), dtype=np.float32)
+    for row, counts in enumerate(documents):
+        # Sublinear term frequency
+        weights = {term: math.log1p(count) * idf[term] for term, count in counts.items()}
+        if weights:
+            norms[row] = math.sqrt(sum(w * w for w in weights.values()))
+        for term, weight in weights.items():
+            if term in columns:
+                matrix[row, columns[term]] = weight
+
+    matrix /= norms[:, np.newaxis]
+
+    return matrix @ matrix.T
+
+
+def find_duplicates(
+    texts: List[str], threshold: float = DUPLICATE_SIMILARITY_THRESHOLD
+) -> List[int]:
+    """
+    Returns the indexes of the texts that are near duplicates of an earlier text. A text is only
+    compared against the earlier texts that are not duplicates themselves.
+    """
+    if len(texts) < 2:
+        return []
+
+    similarities = similarity_matrix(texts)
+    kept: List[int] = []
+    duplicates: List[int] = []
+    for i in range(len(texts)):
+        if kept and similarities[i, kept].max() >= threshold:
+            duplicates.append(i)
+        else:
+            kept.append(i)
+
+    return duplicates
@@ -1,12 +1,67 @@
+import os
 import re
 import json
-from typing import List, Literal
-import openai
-from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tempfile import TemporaryFile
+from functools import lru_cache
+from threading import Lock
+from typing import Callable, Dict, List, Literal, Optional
+from langdetect import DetectorFactory, detect_langs
+from langdetect.lang_detect_exception import LangDetectException
 from langchain_community.document_loaders import PyPDFLoader, UnstructuredMarkdownLoader
 from langchain_core.pydantic_v1 import BaseModel, Field
-from util.index import get_file_extension
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from util.index import get_file_extension, file_sha256
+from util.quizgpt.document_cache import DocumentCache
+from util.quizgpt.segmenter import TokenSegmenter
+from util.quizgpt.response_cache import ResponseCache, make_key
+from util.quizgpt.duplicates import find_duplicates
+from util.quizgpt.rate_limit import RateLimiter, call_with_backoff, estimate_tokens
+from util.quizgpt.clients import GPTClients, get_clients
+from util.quizgpt.pages import (
+    Pages,
+    PageFile,
+    PageFileWriter,
+    Segment,
+    TextSegment,
+)
+
+
+# Model used to generate the questions
+QUESTION_MODEL = "gpt-4o"
+# Estimated number of tokens of a generated question, counted against the rate limit
+QUESTION_COMPLETION_TOKENS = 300
+# Model used to detect the document language, when it cannot be detected locally
+LANGUAGE_DETECTION_MODEL = "gpt-3.5-turbo-0125"
+LANGUAGE_DETECTION_COMPLETION_TOKENS = 10
+# Version of the question generating prompts, must be changed whenever the prompts change so
+# the cached questions generated from the previous prompts are not reused
+PROMPT_VERSION = "1"
+
+# Number of times near duplicate questions are regenerated before they are discarded
+DUPLICATE_REGENERATION_ATTEMPTS = 2
+
+# Number of pages sampled when detecting the document language locally
+LANGUAGE_DETECTION_SAMPLES = 8
+# Number of characters of each sampled page used to detect its language
+LANGUAGE_DETECTION_SAMPLE_LENGTH = 2000
+# Minimum number of word characters a page must have to be sampled
+LANGUAGE_DETECTION_MIN_SAMPLE_LENGTH = 40
+# Minimum average probability of the voted language for the local detection to be trusted
+LANGUAGE_DETECTION_MIN_CONFIDENCE = 0.7
+
+# Make langdetect's results deterministic
+DetectorFactory.seed = 0
+
+
+@lru_cache(maxsize=None)
+def get_languages() -> Dict[str, str]:
+    """
+    Returns the known languages as a dictionary of ISO 639-1 codes to lower case language names.
+    The languages file is only read once per process.
+    """
+    with open(os.path.join(os.path.dirname(__file__), "languages.json")) as f:
+        return {l["code"]: l["name"].lower() for l in json.load(f)}
 
 
 class Answer(BaseModel):
@@ -25,28 +80,213 @@ class Question(BaseModel):
     message: str = Field(description="An additional response message")
 
 
+class SegmentQuestion(Question):
+    segment: int = Field(
+        description="The number of the text segment the question was generated from"
+    )
+
+
 class Exam(BaseModel):
-    questions: List[Question] = Field(description="List of exam questions")
+    questions: List[SegmentQuestion] = Field(description="List of exam questions")
     language: str = Field(description="The language of the provided text")
 
 
 class QuizGPT:
-    def __init__(self, files: List[str]) -> None:
-        pages = []
-        for file in files:
-            file_extension = get_file_extension(file)
+    def __init__(
+        self,
+        files: List[str],
+        max_concurrency: int = 8,
+        batch_size: int = 1,
+        max_segment_tokens: int = 3000,
+        document_cache: Optional[DocumentCache] = None,
+        response_cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        clients: Optional[GPTClients] = None,
+        gpt_language_detection: bool = True,
+        language: Optional[str] = None,
+        on_progress: Optional[Callable[[str, int, int], None]] = None,
+        on_question: Optional[Callable[[int, Question], None]] = None,
+    ) -> None:
+        """
+        `max_concurrency` is the maximum number of GPT requests that are allowed to be in flight at the
+        same time while generating questions.
+
+        `batch_size` is the number of adjacent segments whose questions are generated by a single GPT
+        request. With a batch size of 1, every question is generated by its own request.
+
+        `max_segment_tokens` is the maximum number of material text tokens a question is generated from.
+
+        `document_cache` is used to skip parsing and language detection of files that were already
+        processed before.
+
+        `response_cache` is used to reuse the questions previously generated from the same segments.
+
+        `rate_limiter` is waited for before every GPT request, to stay within the account's limits.
+
+        `clients` are the GPT clients used to make the requests, the process' clients by default.
+
+        `gpt_language_detection` allows falling back to GPT when the language of a file cannot be
+        detected locally. Without it, no GPT request is made while loading the files, and files
+        whose language could not be detected are cached without a language.
+
+        `language` is the language of the material, detected from the files when it is not provided.
+        Questions of segments split by another QuizGPT (on another worker) are generated without
+        any file, in the language the other QuizGPT detected.
+
+        `on_progress` is called with the current stage ("parsing", "language", "generation" or
+        "regeneration"), the number of files or segments the stage is done with, and the total
+        number of files or segments of the stage.
+
+        `on_question` is called with the segment index and the question whenever the question of a
+        segment is generated or replaced, as soon as it is. Unsuccessful questions are also passed,
+        they mean the segment does not have a question (anymore).
+        """
+        if type(max_concurrency) is not int or max_concurrency < 1:
+            raise ValueError("The max concurrency must be an integer greater than 0.")
+        if type(batch_size) is not int or batch_size < 1:
+            raise ValueError("The batch size must be an integer greater than 0.")
+        if type(max_segment_tokens) is not int or max_segment_tokens < 1:
+            raise ValueError(
+                "The max segment tokens must be an integer greater than 0."
+            )
+
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        # Number of question generating GPT requests made, used to measure the effect of batching
+        self.request_count = 0
+        self._request_count_lock = Lock()
+        # Number of tokens of the whole document, and of the segments questions are generated from
+        self.token_usage = {"document_tokens": 0, "segment_tokens": 0}
+
+        self.max_segment_tokens = max_segment_tokens
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        # Only created when a GPT request is made, e.g. a preflight never makes any
+        self._clients = clients
+        self.gpt_language_detection = gpt_language_detection
+        self.on_progress = on_progress
+        self.on_question = on_question
+        self._segmenter: Optional[TokenSegmenter] = None
+
+        page_files: List[PageFile] = []
+        # Number of pages written in each of the files' languages
+        language_pages: Dict[Optional[str], int] = {}
+        try:
+            for i, file in enumerate(files):
+                self._report_progress("parsing", i, len(files))
+                page_file = self._load_file(file, document_cache)
+                self._report_progress("language", i + 1, len(files))
+                page_files.append(page_file)
+                language_pages[page_file.language] = language_pages.get(
+                    page_file.language, 0
+                ) + len(page_file)
+        except BaseException:
+            for page_file in page_files:
+                page_file.close()
+            raise
+
+        # Pages are kept on disk and only read when a segment or language sample needs them
+        self.pages = Pages(page_files)
+        # The document's language is the language most of the pages are written in
+        known_language_pages = {
+            l: count
+            for l, count in language_pages.items()
+            if l is not None and l != "unknown"
+        }
+        self.language = (
+            max(known_language_pages, key=known_language_pages.get)
+            if known_language_pages
+            else "unknown"
+        )
+        if language:
+            self.language = language
+
+    @property
+    def clients(self) -> GPTClients:
+        """
+        GPT clients the requests are made with, the process' clients unless others were provided
+        """
+        if self._clients is None:
+            self._clients = get_clients()
+        return self._clients
+
+    @staticmethod
+    def warm_up(clients: GPTClients) -> None:
+        """
+        Builds the structured output runnables used to generate questions ahead of time
+        """
+        clients.structured_output(QUESTION_MODEL, Question)
+        clients.structured_output(QUESTION_MODEL, Exam)
+
+    def close(self) -> None:
+        """
+        Closes the files holding the pages, temporary page files are removed
+        """
+        self.pages.close()
 
-            if file_extension in ["md", "markdown"]:
-                loader = UnstructuredMarkdownLoader(file)
-            elif file_extension in ["pdf"]:
-                loader = PyPDFLoader(file)
+    def _report_progress(self, stage: str, current: int, total: int) -> None:
+        if self.on_progress:
+            self.on_progress(stage, current, total)
 
-            documents = loader.load_and_split()
-            pages.extend(documents)
+    def _report_question(self, index: int, question: Question) -> None:
+        if self.on_question:
+            self.on_question(index, question)
 
-        self.pages = pages
-        self.language = self._detect_document_language()
-        self.language = self._validate_language_or_default(self.language, "unknown")
+    def _load_file(
+        self, file: str, document_cache: Optional[DocumentCache]
+    ) -> PageFile:
+        """
+        Streams the cleaned pages of a file into a page file and detects their language, or gets
+        them from the document cache if the file's content was already processed before.
+        """
+        key = file_sha256(file) if document_cache else None
+        if document_cache:
+            cached = document_cache.get(key)
+            if cached:
+                # The language could not be detected without GPT when the file was cached
+                if cached.language is None and self.gpt_language_detection:
+                    cached.language = self._validate_language_or_default(
+                        self._detect_document_language(cached), "unknown"
+                    )
+                    # So the next jobs of the same file do not detect it again
+                    document_cache.set_language(key, cached.language)
+                return cached
+
+        file_extension = get_file_extension(file)
+
+        if file_extension in ["md", "markdown"]:
+            loader = UnstructuredMarkdownLoader(file)
+        elif file_extension in ["pdf"]:
+            loader = PyPDFLoader(file)
+
+        # Without a cache, the pages are spooled to an anonymous file removed once it is closed
+        writer = (
+            document_cache.create()
+            if document_cache
+            else PageFileWriter(TemporaryFile())
+        )
+        try:
+            # Same chunks `loader.load_and_split()` returns, without holding every page in memory
+            text_splitter = RecursiveCharacterTextSplitter()
+            for document in loader.lazy_load():
+                for chunk in text_splitter.split_documents([document]):
+                    writer.add(self._clean_text(chunk.page_content))
+
+            if self.gpt_language_detection:
+                language = self._detect_document_language(writer.pages())
+            else:
+                language = self._detect_document_language_locally(writer.pages())
+            if language is not None:
+                language = self._validate_language_or_default(language, "unknown")
+            page_file = writer.finish(language)
+        except BaseException:
+            writer.discard()
+            raise
+
+        if document_cache:
+            document_cache.add(key, writer)
+
+        return page_file
 
     def _clean_text(self, text: str) -> str:
         """
@@ -61,12 +301,72 @@ class QuizGPT:
 
         return text
 
-    def _detect_document_language(self) -> str:
+    def _detect_document_language(self, pages: PageFile) -> str:
+        """
+        Detect language of document locally, falling back to GPT when the local detection is not
+        confident enough (e.g. when most pages are images, or the text mixes multiple languages).
+        """
+        language = self._detect_document_language_locally(pages)
+        if language is not None:
+            return language
+
+        return self._gpt_detect_document_language(pages)
+
+    def _detect_document_language_locally(
+        self, pages: PageFile
+    ) -> Optional[str]:
+        """
+        Detect language of document by sampling text from pages spread across the document, and
+        voting on the language detected for each sample. Returns `None` if the vote is not
+        confident enough.
+        """
+        total_pages = len(pages)
+        if total_pages == 0:
+            return None
+
+        # Visit evenly spread pages first, then shift the spread until we have enough samples
+        step = max(1, total_pages // LANGUAGE_DETECTION_SAMPLES)
+        page_indexes = [
+            i for offset in range(step) for i in range(offset, total_pages, step)
+        ]
+
+        votes: Dict[str, float] = {}
+        samples = 0
+        for i in page_indexes:
+            if samples >= LANGUAGE_DETECTION_SAMPLES:
+                break
+
+            text = pages[i][:LANGUAGE_DETECTION_SAMPLE_LENGTH]
+            # Skip pages without enough text to detect a language from (image only pages, titles...)
+            if len(re.findall(r"\w", text)) < LANGUAGE_DETECTION_MIN_SAMPLE_LENGTH:
+                continue
+
+            try:
+                detected = detect_langs(text)
+            except LangDetectException:
+                continue
+
+            samples += 1
+            top = detected[0]
+            # langdetect uses region suffixes for some languages (zh-cn, zh-tw)
+            code = top.lang.split("-")[0]
+            votes[code] = votes.get(code, 0) + top.prob
+
+        if not votes:
+            return None
+
+        code = max(votes, key=votes.get)
+        confidence = votes[code] / samples
+        if confidence < LANGUAGE_DETECTION_MIN_CONFIDENCE:
+            return None
+
+        return get_languages().get(code)
+
+    def _gpt_detect_document_language(self, pages: PageFile) -> str:
         """
         Detect language of document using GPT.
-        Could use another method to detect language, but this will do for now.
         """
-        total_pages = len(self.pages)
+        total_pages = len(pages)
 
         # Function to find the middle index and adjust
         def find_middle_index(current_page: int) -> int:
@@ -83,14 +383,18 @@ class QuizGPT:
             if current_page >= total_pages:
                 return "unknown"
 
-            text = self.pages[current_page].page_content
-            text = self._clean_text(text)
+            text = pages[current_page]
             # Prepare a prompt for GPT to detect the language of the content
             prompt = f"What language is the following text written in? If you do not know, respond with lower case 'unknown'.\n{text}"
             # Call the GPT API to detect the language
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                messages=[{"role": "user", "content": prompt}],
+            response = call_with_backoff(
+                lambda: self.clients.openai.chat.completions.create(
+                    model=LANGUAGE_DETECTION_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                ),
+                model=LANGUAGE_DETECTION_MODEL,
+                tokens=estimate_tokens(prompt) + LANGUAGE_DETECTION_COMPLETION_TOKENS,
+                rate_limiter=self.rate_limiter,
             )
             # Return the detected language text
             detected_language = response.choices[0].message.content.lower()
@@ -107,48 +411,69 @@ class QuizGPT:
         Validates the language provided, whether it is a real language or not. If
         not, returns the provided `default` value.
         """
-        with open("util/quizgpt/languages.json") as f:
-            d = json.load(f)
-            languages: List[str] = [l["name"].lower() for l in d]
+        if value.lower() in get_languages().values():
+            return value
 
-            if value.lower() in languages:
-                return value
+        return default
 
-            return default
-
-    def _extract_content(self, pages: List[Document]) -> str:
+    def _split_content(self, num_segments: int) -> List[Segment]:
         """
-        Extracts the text content from the provided pages and combines them into a single string variable.
+        Splits the combined text content of the pages into segments of whole sentences with
+        approximately equal numbers of tokens, each within the token budget, and returns them
         """
-        combined_text = " ".join(pages.page_content for pages in pages)
-        return self._clean_text(combined_text)
+        if self._segmenter is None:
+            self._segmenter = TokenSegmenter(
+                self.pages, self.max_segment_tokens, model=QUESTION_MODEL
+            )
+        segments = self._segmenter.split(num_segments)
 
-    def _split_content(self, content, num_segments) -> List[str]:
-        """
-        Splits content into approximately equal segments and returns them
-        """
-        # Split content into approximately equal segments
-        segment_length = len(content) // num_segments
-        segments = [
-            content[i * segment_length : (i + 1) * segment_length]
-            for i in range(num_segments)
-        ]
-        # Handle any remaining content by adding it to the last segment
-        if len(content) % num_segments != 0:
-            segments[-1] += content[num_segments * segment_length :]
+        self.token_usage["document_tokens"] = self._segmenter.total_tokens
+        self.token_usage["segment_tokens"] = sum(s.tokens for s in segments)
         return segments
 
-    def _gpt_generate_question(self, content: str) -> Question:
+    def segment_texts(self, num_questions: int) -> List[str]:
         """
-        Generates a question based on the provided content using GPT
+        Splits the content into the segments the questions are generated from, like
+        `generate_questions` does, and returns their texts so their questions can be generated
+        by other workers with `generate_segment_questions`
         """
-        llm = ChatOpenAI(model="gpt-4o")
+        return [s.text() for s in self._split_content(num_questions)]
 
-        # structured_llm = llm.with_structured_output(Exam)
-        structured_llm = llm.with_structured_output(Question)
+    def preflight(self, num_questions: int, min_segment_tokens: int) -> dict:
+        """
+        Plans the generation of `num_questions` questions without making any GPT request. The number
+        of questions is clamped to the number of segments of at least `min_segment_tokens` tokens
+        the material can be split into, 0 meaning the material is too short for any question.
 
-        PROMPT = f"""
-        Based on the below exam material text, generate a single exam question. Apply the following rules:
+        Returns the planned number of questions, the tokens of each planned segment and the number
+        of question generating GPT requests (before any regeneration).
+        """
+        if type(num_questions) is not int or num_questions < 1:
+            raise ValueError(
+                "The number of questions must be an integer greater than 0."
+            )
+
+        segments = self._split_content(1)
+        document_tokens = self.token_usage["document_tokens"]
+        feasible_questions = min(num_questions, document_tokens // min_segment_tokens)
+        if feasible_questions > 1:
+            segments = self._split_content(feasible_questions)
+
+        segment_tokens = [s.tokens for s in segments] if feasible_questions > 0 else []
+        return {
+            "requested_number_of_questions": num_questions,
+            "number_of_questions": feasible_questions,
+            "language": self.language,
+            "document_tokens": document_tokens,
+            "segment_tokens": segment_tokens,
+            "estimated_gpt_requests": -(-feasible_questions // self.batch_size),
+        }
+
+    def _question_rules(self) -> str:
+        """
+        Returns the rules every generated question must follow, shared by the single and batched prompts
+        """
+        return f"""
         - {f"The question's language must be {self.language}." if self.language else "Detect the question's language based on the material text."}
         - Create exactly 4 answers for the question.
         - The generated question must be meaningful and relevant to the provided content.
@@ -159,18 +484,244 @@ class QuizGPT:
         - - If the content is irrelevant, use the exact message: "The content is irrelevant to generate a question."
         - - If the content is too vague, use the exact message: "The content is too vague to generate a question."
         - - If none of the above apply, use the exact message: "The question could not be generated." + additional text that provides a reason as to why the question could not be generated.
+        """
+
+    def _count_request(self) -> None:
+        with self._request_count_lock:
+            self.request_count += 1
+
+    def _gpt_generate_question(self, content: str) -> Question:
+        """
+        Generates a question based on the provided content using GPT
+        """
+        structured_llm = self.clients.structured_output(QUESTION_MODEL, Question)
+
+        PROMPT = f"""
+        Based on the below exam material text, generate a single exam question. Apply the following rules:
+        {self._question_rules()}
 
         Text:
         {content}
         """
 
-        result = structured_llm.invoke(PROMPT)
+        self._count_request()
+        result = call_with_backoff(
+            lambda: structured_llm.invoke(PROMPT),
+            model=QUESTION_MODEL,
+            tokens=estimate_tokens(PROMPT) + QUESTION_COMPLETION_TOKENS,
+            rate_limiter=self.rate_limiter,
+        )
         return result
 
+    def _gpt_generate_questions_batch(self, contents: List[str]) -> List[Question]:
+        """
+        Generates a question for each of the provided contents using a single GPT request. The
+        returned questions are in the same order as the contents, a content GPT did not return a
+        question for gets an unsuccessful question.
+        """
+        structured_llm = self.clients.structured_output(QUESTION_MODEL, Exam)
+
+        texts = "\n".join(
+            f"""
+        Segment {i + 1}:
+        {content}
+        """
+            for i, content in enumerate(contents)
+        )
+
+        PROMPT = f"""
+        Below are {len(contents)} numbered exam material text segments. For each segment, generate a single exam question based only on that segment's text, and set the question's `segment` field to the segment's number. Apply the following rules to every question:
+        {self._question_rules()}
+
+        {texts}
+        """
+
+        self._count_request()
+        exam: Exam = call_with_backoff(
+            lambda: structured_llm.invoke(PROMPT),
+            model=QUESTION_MODEL,
+            tokens=estimate_tokens(PROMPT)
+            + QUESTION_COMPLETION_TOKENS * len(contents),
+            rate_limiter=self.rate_limiter,
+        )
+
+        questions: List[Optional[Question]] = [None] * len(contents)
+        for q in exam.questions:
+            if 1 <= q.segment <= len(contents) and questions[q.segment - 1] is None:
+                questions[q.segment - 1] = Question(**q.dict(exclude={"segment"}))
+
+        return [
+            (
+                q
+                if q is not None
+                else Question(
+                    title="",
+                    answers=[],
+                    language=self.language,
+                    success=False,
+                    message="The question could not be generated. No question was returned for the segment.",
+                )
+            )
+            for q in questions
+        ]
+
+    def _generate_concurrently(
+        self,
+        segments: List[Segment],
+        abort_if_too_short: bool = False,
+        use_cache: bool = True,
+        stage: Optional[str] = None,
+        on_question: Optional[Callable[[int, Question], None]] = None,
+    ) -> Optional[List[Question]]:
+        """
+        Generates a question for each of the provided segments, running up to `self.max_concurrency`
+        GPT requests at the same time. Adjacent segments are grouped into a single request when
+        `self.batch_size` is greater than 1. The returned questions are in the same order as the segments.
+        A segment's text is only read once its request is about to be made.
+
+        If `abort_if_too_short` is set, the remaining requests are cancelled as soon as one of the
+        questions fails because its content is too short, and `None` is returned.
+
+        If `use_cache` is not set, the response cache is not read from, but the generated questions
+        still replace the cached ones.
+
+        The progress of `stage` is reported as the segments' questions arrive, and `on_question` is
+        called with the index of the segment and its question.
+        """
+        questions: List[Optional[Question]] = [None] * len(segments)
+        if not segments:
+            return questions
+
+        # Each batch is the index of its first segment, and the segments it groups
+        batches = [
+            (i, segments[i : i + self.batch_size])
+            for i in range(0, len(segments), self.batch_size)
+        ]
+
+        def generate_batch(batch: List[Segment]) -> List[Question]:
+            contents = [s.text() for s in batch]
+            keys = [
+                make_key(content, self.language, QUESTION_MODEL, PROMPT_VERSION)
+                for content in contents
+            ]
+            batch_questions: List[Optional[Question]] = [None] * len(batch)
+            if self.response_cache and use_cache:
+                for i, key in enumerate(keys):
+                    cached = self.response_cache.get(key)
+                    if cached is not None:
+                        batch_questions[i] = Question.parse_raw(cached)
+
+            # Only request the questions that were not cached
+            missing = [i for i, q in enumerate(batch_questions) if q is None]
+            if len(missing) == 1:
+                generated = [self._gpt_generate_question(contents[missing[0]])]
+            elif missing:
+                generated = self._gpt_generate_questions_batch(
+                    [contents[i] for i in missing]
+                )
+            else:
+                generated = []
+
+            for i, question in zip(missing, generated):
+                batch_questions[i] = question
+                # A failure (e.g. a model error or a too short segment) may not happen again, it
+                # is not cached so the next job asks for the question again
+                if self.response_cache and question.success:
+                    self.response_cache.set(keys[i], question.json())
+
+            return batch_questions
+
+        if stage:
+            self._report_progress(stage, 0, len(segments))
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(batches))
+        )
+        try:
+            futures = {
+                executor.submit(generate_batch, batch): start for start, batch in batches
+            }
+            done = 0
+            for future in as_completed(futures):
+                start = futures[future]
+                batch_questions = future.result()
+                for offset, question in enumerate(batch_questions):
+                    if (
+                        abort_if_too_short
+                        and not question.success
+                        and "too short" in question.message
+                    ):
+                        return None
+
+                    questions[start + offset] = question
+                    if on_question:
+                        on_question(start + offset, question)
+
+                done += len(batch_questions)
+                if stage:
+                    self._report_progress(stage, done, len(segments))
+        finally:
+            # Do not start any requests that are still queued, in case we returned or raised early
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return questions
+
+    def _replace_duplicate_questions(
+        self, questions: List[Question], segments: List[Segment]
+    ) -> int:
+        """
+        Regenerates the questions that are near duplicates of other questions from their segments.
+        Questions that are still duplicates after `DUPLICATE_REGENERATION_ATTEMPTS` attempts are
+        marked as unsuccessful.
+
+        Returns the number of duplicate questions that could not be replaced.
+        """
+
+        def find_duplicate_indexes() -> List[int]:
+            indexes = [i for i, q in enumerate(questions) if q.success and q.title]
+            texts = [
+                " ".join([q.title, *(a.title for a in q.answers)])
+                for q in (questions[i] for i in indexes)
+            ]
+            return [indexes[i] for i in find_duplicates(texts)]
+
+        regenerated_indexes = set()
+        duplicate_indexes = find_duplicate_indexes()
+        for _ in range(DUPLICATE_REGENERATION_ATTEMPTS):
+            if not duplicate_indexes:
+                break
+
+            # The cached questions are the duplicates, so they must not be reused
+            def replace(index: int, new_question: Question) -> None:
+                questions[duplicate_indexes[index]] = new_question
+                self._report_question(duplicate_indexes[index], new_question)
+
+            self._generate_concurrently(
+                [segments[i] for i in duplicate_indexes],
+                use_cache=False,
+                stage="regeneration",
+                on_question=replace,
+            )
+            regenerated_indexes.update(duplicate_indexes)
+
+            duplicate_indexes = find_duplicate_indexes()
+
+        for i in duplicate_indexes:
+            questions[i].success = False
+            questions[i].message = "The question is a duplicate of another question."
+            self._report_question(i, questions[i])
+
+        # Regenerated questions can also fail for other reasons, they are discarded as well
+        return sum(
+            1
+            for i in regenerated_indexes | set(duplicate_indexes)
+            if not questions[i].success or not questions[i].title
+        )
+
     def generate_questions(
         self, num_questions: int
     ) -> tuple[
-        List[Question], Literal["success", "too-short", "irrelevant", "vague"], str
+        List[Question], Literal["success", "too-short", "irrelevant", "vague", "duplicate"], str
     ]:
         """
         Generates questions from the provided pages.
@@ -185,66 +736,101 @@ class QuizGPT:
                 "The number of questions must be an integer greater than 0."
             )
 
-        total_pages = len(self.pages)
-
-        segments = []
+        segments = self._split_content(num_questions)
 
-        # Return values
-        questions: List[Question] = []
-        status_code_message: str = ""
-        message: str = ""
+        # Generate questions for each segment
+        generated_questions = self._generate_concurrently(
+            segments,
+            abort_if_too_short=True,
+            stage="generation",
+            on_question=self._report_question,
+        )
+        # If the question could not generate due to content being too short, we can assume that the
+        # each provided segment is too short, not just this particular segment. Meaning that
+        # the user is asking for too much questions for their provided content.
+        #
+        # We do not want to proceed with this, because even though other questions might succeed,
+        # there is a probability that the short content of the question will affect its quality. ##
+        if generated_questions is None:
+            return (
+                [],
+                "too-short",
+                "The provided content is too short to generate questions.",
+            )
 
-        # If there are more questions than pages, we'll need to split the content into more segments
-        if num_questions > total_pages:
-            content = self._extract_content(self.pages)
-            segments = self._split_content(content, num_questions)
-        else:
-            segments = []
-            ratio = total_pages / num_questions
-            for i in range(num_questions):
-                start_page = int(i * ratio)
-                end_page = int((i + 1) * ratio) if ratio > 1 else start_page + 1
-                end_page = min(end_page, total_pages)
-                segment_content = self._extract_content(self.pages[start_page:end_page])
-                segments.append(segment_content)
+        return self._complete_questions(generated_questions, segments)
 
-        # Generate questions for each segment
-        for segment in segments:
-            question = self._gpt_generate_question(segment)
-            if not question.success:
-                # If the question could not generate due to content being too short, we can assume that the
-                # each provided segment is too short, not just this particular segment. Meaning that
-                # the user is asking for too much questions for their provided content.
-                #
-                # We do not want to proceed with this, because even though other questions might succeed,
-                # there is a probability that the short content of the question will affect its quality. ##
-                if "too short" in question.message:
-                    return (
-                        [],
-                        "too-short",
-                        "The provided content is too short to generate questions.",
-                    )
+    def generate_segment_questions(
+        self, texts: List[str], first_index: int = 0
+    ) -> Optional[List[Question]]:
+        """
+        Generates a question for each of the segment texts, numbered from `first_index` on when
+        reported to `on_question`. Returns `None` if one of the segments is too short to generate a
+        question from, the other segments are then too short as well.
+        """
+        return self._generate_concurrently(
+            [TextSegment(text) for text in texts],
+            abort_if_too_short=True,
+            on_question=lambda i, question: self._report_question(
+                first_index + i, question
+            ),
+        )
+
+    def complete_questions(
+        self, questions: List[Question], texts: List[str]
+    ) -> tuple[
+        List[Question], Literal["success", "too-short", "irrelevant", "vague", "duplicate"], str
+    ]:
+        """
+        Completes the questions generated from the segment texts by `generate_segment_questions`,
+        regenerating the unsuccessful and duplicate questions. Returns the same values as
+        `generate_questions`.
+        """
+        return self._complete_questions(
+            questions, [TextSegment(text) for text in texts]
+        )
 
-            questions.append(question)
+    def _complete_questions(
+        self, questions: List[Question], segments: List[Segment]
+    ) -> tuple[
+        List[Question], Literal["success", "too-short", "irrelevant", "vague", "duplicate"], str
+    ]:
+        status_code_message: str = ""
+        message: str = ""
 
-        failed_questions_count = 0
         # In case there are any unsuccessful questions, attempt to regenerate them
-        for i, question in enumerate(questions):
-            # Find the unsuccessful question
-            if not question.success or not question.title:
-                unsuccessful_question_segment = segments[i]
-                new_question = self._gpt_generate_question(
-                    unsuccessful_question_segment
-                )
-                # If the new generated question was still unsuccessful, we can assume GPT is simply unable
-                # to generate the question from the provided segment.
-                if not new_question.success or not new_question.title:
-                    failed_questions_count += 1
-                    # Skip this question.
-                    continue
+        unsuccessful_indexes = [
+            i for i, q in enumerate(questions) if not q.success or not q.title
+        ]
+        failed_questions_count = 0
 
-                # Otherwise we replace the unsuccessful question with the new one.
-                questions[i] = new_question
+        def replace_unsuccessful(index: int, new_question: Question) -> None:
+            nonlocal failed_questions_count
+            # If the new generated question was still unsuccessful, we can assume GPT is simply unable
+            # to generate the question from the provided segment.
+            if not new_question.success or not new_question.title:
+                failed_questions_count += 1
+                # Skip this question.
+                return
+
+            # Otherwise we replace the unsuccessful question with the new one.
+            questions[unsuccessful_indexes[index]] = new_question
+            self._report_question(unsuccessful_indexes[index], new_question)
+
+        # The cached questions are the ones that failed, so they must not be reused
+        self._generate_concurrently(
+            [segments[i] for i in unsuccessful_indexes],
+            use_cache=False,
+            stage="regeneration",
+            on_question=replace_unsuccessful,
+        )
+
+        # The duplicates that could not be replaced are dropped as well, so the quiz has fewer
+        # questions than requested
+        duplicate_questions_count = self._replace_duplicate_questions(
+            questions, segments
+        )
+        failed_questions_count += duplicate_questions_count
 
         if failed_questions_count > 0:
             message = f"{failed_questions_count} questions could not be generated."
@@ -259,6 +845,10 @@ class QuizGPT:
                     elif "vague" in q.message:
                         status_code_message = "vague"
                         message += " The content is too vague to generate a question."
+            if duplicate_questions_count > 0:
+                message += f" {duplicate_questions_count} duplicate questions were removed."
+                if not status_code_message:
+                    status_code_message = "duplicate"
         else:
             status_code_message = "success"
             message = "All questions were successfully generated."
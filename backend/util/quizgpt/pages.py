@@ -0,0 +1,249 @@
+import os
+import json
+import zlib
+import struct
+from bisect import bisect_right
+from threading import Lock
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+# Page files layout:
+# - MAGIC
+# - The zlib compressed text of every page, one after the other
+# - The zlib compressed JSON index:
+#   {"language": str | null, "pages": [[offset, compressed length, text length], ...]}
+# - The offset of the index as an unsigned 64 bit integer
+MAGIC = b"QGPF\x01"
+INDEX_OFFSET_FORMAT = "<Q"
+INDEX_OFFSET_SIZE = struct.calcsize(INDEX_OFFSET_FORMAT)
+
+# Pages are joined with this separator when combined into a single text
+PAGE_SEPARATOR = " "
+
+
+class PageFile:
+    """
+    Pages of a document stored on disk. Pages are only read (and kept in memory) when accessed,
+    so the size of the document does not affect the memory usage.
+    """
+
+    def __init__(
+        self, file: BinaryIO, index: List[List[int]], language: Optional[str] = None
+    ) -> None:
+        self._file = file
+        self._index = index
+        # Reading a page is a seek followed by a read, which must not interleave between threads
+        self._lock = Lock()
+        self.language = language
+
+    @classmethod
+    def open(cls, path: str) -> "PageFile":
+        """
+        Opens a finished page file, raises `ValueError` if the file is not a valid page file
+        """
+        file = open(path, "rb")
+        try:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError("Invalid page file")
+
+            file.seek(-INDEX_OFFSET_SIZE, os.SEEK_END)
+            end = file.tell()
+            (index_offset,) = struct.unpack(
+                INDEX_OFFSET_FORMAT, file.read(INDEX_OFFSET_SIZE)
+            )
+            file.seek(index_offset)
+            index = json.loads(zlib.decompress(file.read(end - index_offset)))
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            file.close()
+            raise ValueError("Invalid page file") from e
+
+        return cls(file, index["pages"], language=index["language"])
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, i: int) -> str:
+        offset, compressed_length, _ = self._index[i]
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(compressed_length)
+        return zlib.decompress(data).decode("utf-8")
+
+    def compressed_pages(self) -> Iterator[Tuple[bytes, int]]:
+        """
+        The compressed data and text length of every page, to copy them without decompressing
+        them
+        """
+        for offset, compressed_length, length in self._index:
+            with self._lock:
+                self._file.seek(offset)
+                data = self._file.read(compressed_length)
+            yield data, length
+
+    @property
+    def lengths(self) -> List[int]:
+        """
+        The text length of every page
+        """
+        return [length for _, _, length in self._index]
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PageFileWriter:
+    """
+    Writes pages one at a time to a page file.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+        self._index: List[List[int]] = []
+        self.file.write(MAGIC)
+
+    def add(self, text: str) -> None:
+        data = zlib.compress(text.encode("utf-8"))
+        self._index.append([self.file.tell(), len(data), len(text)])
+        self.file.write(data)
+
+    def add_compressed(self, data: bytes, length: int) -> None:
+        """
+        Adds a page compressed by another writer, see `PageFile.compressed_pages`
+        """
+        self._index.append([self.file.tell(), len(data), length])
+        self.file.write(data)
+
+    def pages(self) -> PageFile:
+        """
+        Returns a reader of the pages written so far, the reader shares the writer's file
+        """
+        self.file.flush()
+        return PageFile(self.file, self._index)
+
+    def finish(self, language: Optional[str]) -> PageFile:
+        """
+        Writes the index of the pages, after which no more pages can be added. The language is
+        `None` if it is not known yet.
+        """
+        self.file.seek(0, os.SEEK_END)
+        index_offset = self.file.tell()
+        index_data = json.dumps({"language": language, "pages": self._index})
+        self.file.write(zlib.compress(index_data.encode("utf-8")))
+        self.file.write(struct.pack(INDEX_OFFSET_FORMAT, index_offset))
+        self.file.flush()
+        return PageFile(self.file, self._index, language=language)
+
+    def discard(self) -> None:
+        """
+        Closes the writer's file and removes it, if it exists on disk
+        """
+        self.file.close()
+        if isinstance(self.file.name, str) and os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+class Pages:
+    """
+    The pages of multiple page files, accessed as if they were a single document.
+    """
+
+    def __init__(self, page_files: List[PageFile]) -> None:
+        self.page_files = page_files
+
+        # Index of the first page of every file
+        self._file_starts: List[int] = []
+        # Offset of every page's first character in the combined text
+        self._offsets: List[int] = []
+        total_pages = 0
+        offset = 0
+        for page_file in page_files:
+            self._file_starts.append(total_pages)
+            total_pages += len(page_file)
+            for length in page_file.lengths:
+                self._offsets.append(offset)
+                offset += length + len(PAGE_SEPARATOR)
+
+        self._total_pages = total_pages
+        self.length = max(offset - len(PAGE_SEPARATOR), 0)
+
+    def __len__(self) -> int:
+        return self._total_pages
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += self._total_pages
+        if not 0 <= i < self._total_pages:
+            raise IndexError("page index out of range")
+
+        file_index = bisect_right(self._file_starts, i) - 1
+        return self.page_files[file_index][i - self._file_starts[file_index]]
+
+    def __iter__(self) -> Iterator[str]:
+        for page_file in self.page_files:
+            for i in range(len(page_file)):
+                yield page_file[i]
+
+    def offset(self, page: int) -> int:
+        """
+        Offset of the page's first character in the combined text, or the combined text's length
+        if the page is past the last page
+        """
+        if page >= self._total_pages:
+            return self.length
+        return self._offsets[page]
+
+    def text(self, start: int, end: int) -> str:
+        """
+        Returns the `[start, end)` characters of the combined text, only reading the pages
+        the range covers
+        """
+        if start >= end:
+            return ""
+
+        parts = []
+        page = max(bisect_right(self._offsets, start) - 1, 0)
+        while page < self._total_pages and self._offsets[page] < end:
+            page_start = self._offsets[page]
+            page_text = self[page] + PAGE_SEPARATOR
+            parts.append(page_text[max(start - page_start, 0) : end - page_start])
+            page += 1
+
+        return "".join(parts)
+
+    def close(self) -> None:
+        for page_file in self.page_files:
+            page_file.close()
+
+
+class Segment:
+    """
+    A `[start, end)` character range of the combined text of the pages. The text of the segment
+    is only read when needed.
+    """
+
+    def __init__(self, pages: Pages, start: int, end: int, tokens: int = 0) -> None:
+        self.pages = pages
+        self.start = start
+        self.end = end
+        # Number of tokens of the segment's text, if it was counted
+        self.tokens = tokens
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def text(self) -> str:
+        return self.pages.text(self.start, self.end)
+
+
+class TextSegment:
+    """
+    A segment whose text is already in memory, e.g. a segment split by another worker
+    """
+
+    def __init__(self, text: str) -> None:
+        self._text = text
+
+    def __len__(self) -> int:
+        return len(self._text)
+
+    def text(self) -> str:
+        return self._text
@@ -0,0 +1,174 @@
+import time
+import random
+from typing import Callable, Iterator, Optional, TypeVar
+import backoff
+import openai
+from redis import Redis
+
+T = TypeVar("T")
+
+# Number of attempts made for a GPT request before its error is raised
+MAX_TRIES = 6
+# Maximum number of seconds waited between two attempts, unless the API asks for longer
+MAX_BACKOFF = 60
+# Errors worth retrying, the others (invalid request, authentication...) would fail again
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Refills both buckets according to the time elapsed since their last update, then takes one
+# request and the requested tokens if both buckets have enough. Returns the number of seconds to
+# wait before trying again, 0 if the request can be made right away.
+#
+# KEYS: requests bucket, tokens bucket
+# ARGV: requests per minute, tokens per minute, requested tokens
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local function refill(key, per_minute)
+    local bucket = redis.call('HMGET', key, 'level', 'updated_at')
+    local level = tonumber(bucket[1]) or per_minute
+    local updated_at = tonumber(bucket[2]) or now
+    return math.min(per_minute, level + (now - updated_at) * per_minute / 60)
+end
+
+local requests_per_minute = tonumber(ARGV[1])
+local tokens_per_minute = tonumber(ARGV[2])
+-- A request can never need more tokens than the bucket holds
+local requested_tokens = math.min(tonumber(ARGV[3]), tokens_per_minute)
+
+local requests = refill(KEYS[1], requests_per_minute)
+local tokens = refill(KEYS[2], tokens_per_minute)
+
+local wait = 0
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60 / requests_per_minute)
+end
+if tokens < requested_tokens then
+    wait = math.max(wait, (requested_tokens - tokens) * 60 / tokens_per_minute)
+end
+
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - requested_tokens
+end
+
+redis.call('HSET', KEYS[1], 'level', requests, 'updated_at', now)
+redis.call('HSET', KEYS[2], 'level', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('EXPIRE', KEYS[2], 120)
+
+-- Numbers returned by scripts are truncated to integers
+return tostring(wait)
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough number of tokens of a text, a token is about 4 characters of english text
+    """
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Token buckets for the requests per minute and tokens per minute limits of the OpenAI account,
+    shared by every worker through Redis. Each model has its own buckets, like the API limits.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        prefix: str = "quizgpt:rate_limit",
+    ) -> None:
+        self.redis = redis
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.prefix = prefix
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, model: str, tokens: int) -> None:
+        """
+        Blocks until a request using `tokens` tokens can be made to the model
+        """
+        while True:
+            wait = float(
+                self._acquire(
+                    keys=[
+                        f"{self.prefix}:{model}:requests",
+                        f"{self.prefix}:{model}:tokens",
+                    ],
+                    args=[self.requests_per_minute, self.tokens_per_minute, tokens],
+                )
+            )
+            if wait <= 0:
+                return
+
+            # Jitter the wait so the waiting workers do not all retry at the same moment
+            time.sleep(wait + random.uniform(0, wait / 2))
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Number of seconds the API asked to wait before retrying, if it did
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _retry_after_expo(
+    base: float = 2, max_value: float = MAX_BACKOFF
+) -> Iterator[Optional[float]]:
+    """
+    `backoff` wait generator, waits for the duration asked by the API's `Retry-After` header
+    when there is one, otherwise for a fully jittered exponential duration
+    """
+    # `backoff` sends the error that caused the retry, the first send initializes the generator
+    error = yield None
+    attempt = 0
+    while True:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # A small jitter, to not retry at the exact same moment as the other workers
+            value = retry_after + random.uniform(0, 1)
+        else:
+            value = random.uniform(0, min(base**attempt, max_value))
+        attempt += 1
+        error = yield value
+
+
+def call_with_backoff(
+    request: Callable[[], T],
+    model: str,
+    tokens: int,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> T:
+    """
+    Makes a GPT request, waiting for the rate limiter first if there is one, and retrying
+    it with backoff if it fails with a retryable error
+    """
+
+    @backoff.on_exception(
+        _retry_after_expo, RETRYABLE_ERRORS, max_tries=MAX_TRIES, jitter=None
+    )
+    def call() -> T:
+        if rate_limiter:
+            rate_limiter.acquire(model, tokens)
+        return request()
+
+    return call()
@@ -0,0 +1,132 @@
+import time
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+from redis import Redis
+
+
+def make_key(content: str, language: str, model: str, prompt_version: str) -> str:
+    """
+    Builds the cache key of a question generated from the provided content
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"{model}:{prompt_version}:{language}:{content_hash}"
+
+
+class ResponseCache(ABC):
+    """
+    Base class of the GPT response caches. Entries expire `ttl` seconds after they were set, and
+    once there are more than `max_entries` entries the least recently used ones are evicted.
+    """
+
+    def __init__(self, ttl: int, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counters_lock = Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        with self._counters_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value)
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]: ...
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> None: ...
+
+
+class InMemoryResponseCache(ResponseCache):
+    """
+    Response cache living in the current process, meant for tests and local development
+    """
+
+    def __init__(self, ttl: int, max_entries: int) -> None:
+        super().__init__(ttl, max_entries)
+        # Key -> (expiry time, value), ordered from least to most recently used
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisResponseCache(ResponseCache):
+    """
+    Response cache shared by every worker through Redis. Entries expire using Redis' own TTL, and
+    their last access times are tracked in a sorted set to evict the least recently used ones.
+    Hits and misses are also counted in Redis, to get the totals of every worker.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: int,
+        max_entries: int,
+        prefix: str = "quizgpt:responses",
+    ) -> None:
+        super().__init__(ttl, max_entries)
+        self.redis = redis
+        self.prefix = prefix
+        self._lru_key = f"{prefix}:lru"
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self.redis.get(self._entry_key(key))
+
+        pipeline = self.redis.pipeline(transaction=False)
+        if value is None:
+            pipeline.zrem(self._lru_key, key)
+            pipeline.incr(f"{self.prefix}:misses")
+        else:
+            pipeline.zadd(self._lru_key, {key: time.time()})
+            pipeline.incr(f"{self.prefix}:hits")
+        pipeline.execute()
+
+        return value.decode("utf-8") if value is not None else None
+
+    def _set(self, key: str, value: str) -> None:
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.set(self._entry_key(key), value, ex=self.ttl)
+        pipeline.zadd(self._lru_key, {key: time.time()})
+        pipeline.zcard(self._lru_key)
+        _, _, total_entries = pipeline.execute()
+
+        if total_entries > self.max_entries:
+            # Pop the least recently used entries, other workers may be evicting at the same time
+            evicted = self.redis.zpopmin(self._lru_key, total_entries - self.max_entries)
+            if evicted:
+                self.redis.delete(
+                    *(self._entry_key(k.decode("utf-8")) for k, _ in evicted)
+                )
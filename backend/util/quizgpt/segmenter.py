@@ -0,0 +1,159 @@
+import re
+from array import array
+from typing import Iterator, List, Tuple
+import tiktoken
+from util.quizgpt.pages import Pages, Segment
+
+# A sentence ends with one or more punctuation marks, optionally followed by closing quotes or
+# brackets, and whitespace.
+SENTENCE_END = re.compile(r"[.!?؟。…]+[\"'”’)\]]*\s+")
+# Sentences longer than this (tables, lists without punctuation...) are split on whitespace
+MAX_SENTENCE_LENGTH = 1000
+
+
+def split_sentences(text: str) -> Iterator[Tuple[int, int]]:
+    """
+    Yields the `[start, end)` character range of every sentence of the text. Page boundaries are
+    the only paragraph boundaries left once the text is cleaned, so a text is expected to be a page.
+    """
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        yield from _split_long_sentence(text, start, match.end())
+        start = match.end()
+    if start < len(text):
+        yield from _split_long_sentence(text, start, len(text))
+
+
+def _split_long_sentence(text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+    while end - start > MAX_SENTENCE_LENGTH:
+        split = text.rfind(" ", start + 1, start + MAX_SENTENCE_LENGTH)
+        if split == -1:
+            split = start + MAX_SENTENCE_LENGTH
+        yield start, split
+        start = split
+    if text[start:end].strip():
+        yield start, end
+
+
+class TokenSegmenter:
+    """
+    Splits the combined text of the pages into segments made of whole sentences, balanced by their
+    number of tokens. Segments are capped to `max_segment_tokens` tokens, a segment whose share of
+    the text is larger only keeps the sentences in the middle of its share.
+    """
+
+    def __init__(self, pages: Pages, max_segment_tokens: int, model: str) -> None:
+        if type(max_segment_tokens) is not int or max_segment_tokens < 1:
+            raise ValueError(
+                "The max segment tokens must be an integer greater than 0."
+            )
+
+        self.pages = pages
+        self.max_segment_tokens = max_segment_tokens
+        self.encoding = tiktoken.encoding_for_model(model)
+
+        # Start offset, end offset and number of tokens of every sentence in the combined text.
+        # Arrays keep this compact, as there can be tens of thousands of sentences.
+        self._starts = array("q")
+        self._ends = array("q")
+        self._tokens = array("q")
+        self.total_tokens = 0
+
+        # Pages are read one at a time, only the sentence boundaries are kept
+        for i, page in enumerate(pages):
+            page_offset = pages.offset(i)
+            for start, end in split_sentences(page):
+                tokens = len(self.encoding.encode_ordinary(page[start:end]))
+                self._starts.append(page_offset + start)
+                self._ends.append(page_offset + end)
+                self._tokens.append(tokens)
+                self.total_tokens += tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def split(self, num_segments: int) -> List[Segment]:
+        """
+        Splits the text into `num_segments` segments. If the text has less sentences than the number
+        of segments, the text is split into equal character ranges instead.
+        """
+        total_sentences = len(self._tokens)
+        if total_sentences < num_segments:
+            return self._split_characters(num_segments)
+
+        # Cut the sentences into contiguous groups, each cut is made at the sentence boundary
+        # closest to the ideal (equal tokens) cut
+        cuts = [0]
+        cumulative = 0
+        sentence = 0
+        for k in range(1, num_segments):
+            target = self.total_tokens * k / num_segments
+            # Leave at least one sentence for each of the remaining groups
+            last_possible_cut = total_sentences - (num_segments - k)
+            while sentence < last_possible_cut and (
+                # Every group needs at least one sentence
+                sentence == cuts[-1]
+                or cumulative + self._tokens[sentence] / 2 < target
+            ):
+                cumulative += self._tokens[sentence]
+                sentence += 1
+            cuts.append(sentence)
+        cuts.append(total_sentences)
+
+        return [
+            self._segment(first, last) for first, last in zip(cuts[:-1], cuts[1:])
+        ]
+
+    def _segment(self, first: int, last: int) -> Segment:
+        """
+        Builds the segment of the `[first, last)` sentences, keeping the middle sentences that fit
+        in the token budget
+        """
+        tokens = sum(self._tokens[first:last])
+        if tokens > self.max_segment_tokens:
+            # Skip the sentences before the centered window
+            skip = (tokens - self.max_segment_tokens) / 2
+            skipped = 0
+            while first < last - 1 and skipped + self._tokens[first] <= skip:
+                skipped += self._tokens[first]
+                first += 1
+
+            tokens = 0
+            end = first
+            budget = self.max_segment_tokens
+            while end < last and tokens + self._tokens[end] <= budget:
+                tokens += self._tokens[end]
+                end += 1
+
+            if end == first:
+                # A single sentence is over the budget, keep the part of it that fits
+                length = self._ends[first] - self._starts[first]
+                return Segment(
+                    self.pages,
+                    self._starts[first],
+                    self._starts[first]
+                    + length * self.max_segment_tokens // self._tokens[first],
+                    tokens=self.max_segment_tokens,
+                )
+
+            last = end
+
+        return Segment(
+            self.pages, self._starts[first], self._ends[last - 1], tokens=tokens
+        )
+
+    def _split_characters(self, num_segments: int) -> List[Segment]:
+        content_length = self.pages.length
+        # Split content into approximately equal segments
+        segment_length = content_length // num_segments
+        segments = [
+            Segment(self.pages, i * segment_length, (i + 1) * segment_length)
+            for i in range(num_segments)
+        ]
+        # Handle any remaining content by adding it to the last segment
+        if content_length % num_segments != 0:
+            segments[-1].end = content_length
+
+        for segment in segments:
+            segment.tokens = self.count_tokens(segment.text())
+        return segments
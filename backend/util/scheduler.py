@@ -0,0 +1,209 @@
+import json
+import time
+import statistics
+from typing import List, Optional, Tuple
+from redis import Redis
+
+# Classes of the quiz generation jobs, from the cheapest to the most expensive. Each class has its
+# own Celery queue, so the workers of a class are never busy with the jobs of another class.
+QUEUE_CLASSES = ("small", "medium", "large")
+# Number of wait times kept per class for the statistics
+MAX_WAIT_SAMPLES = 1000
+
+# Adds a job to the queue of its user, and the user to the round if they were not in it yet. The
+# first user of the round gets its quantum right away, see `POP_SCRIPT`.
+#
+# KEYS: round, deficits, user's queue, payloads, pending counter
+# ARGV: user id, job id, cost, enqueued at, payload, quantum
+PUSH_SCRIPT = """
+redis.call('HSET', KEYS[4], ARGV[2], ARGV[5])
+redis.call('RPUSH', KEYS[3], ARGV[3] .. ':' .. ARGV[4] .. ':' .. ARGV[2])
+redis.call('INCR', KEYS[5])
+if redis.call('LLEN', KEYS[3]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+    if redis.call('LLEN', KEYS[1]) == 1 then
+        redis.call('HSET', KEYS[2], ARGV[1], ARGV[6])
+    end
+end
+return 1
+"""
+
+# Deficit round-robin over the users who have queued jobs: the user at the head of the round runs
+# its jobs while its deficit covers their cost, then the round moves on to the next user. Every
+# user gets a quantum added to its deficit when its turn starts, so each user gets the same share
+# of the workers, whatever the number and cost of the jobs they queued. A user leaving the round
+# loses its deficit. Returns the payload of the job and the seconds it waited, nil if no job is
+# queued.
+#
+# KEYS: round, deficits, payloads, pending counter, wait times
+# ARGV: users' queue key prefix, quantum, now, maximum number of wait times kept
+POP_SCRIPT = """
+local quantum = tonumber(ARGV[2])
+
+local function start_turn()
+    local user = redis.call('LINDEX', KEYS[1], 0)
+    if user then
+        redis.call('HINCRBYFLOAT', KEYS[2], user, quantum)
+    end
+    return user
+end
+
+local user = redis.call('LINDEX', KEYS[1], 0)
+while user do
+    local queue = ARGV[1] .. user
+    local head = redis.call('LINDEX', queue, 0)
+    local cost, enqueued_at, job_id = string.match(head, '^([^:]+):([^:]+):(.+)$')
+    local deficit = tonumber(redis.call('HGET', KEYS[2], user)) or 0
+
+    if deficit >= tonumber(cost) then
+        redis.call('LPOP', queue)
+        redis.call('DECR', KEYS[4])
+        if redis.call('LLEN', queue) == 0 then
+            redis.call('LPOP', KEYS[1])
+            redis.call('HDEL', KEYS[2], user)
+            start_turn()
+        else
+            redis.call('HSET', KEYS[2], user, deficit - tonumber(cost))
+        end
+
+        local payload = redis.call('HGET', KEYS[3], job_id)
+        redis.call('HDEL', KEYS[3], job_id)
+        local wait = math.max(0, tonumber(ARGV[3]) - tonumber(enqueued_at))
+        redis.call('LPUSH', KEYS[5], wait)
+        redis.call('LTRIM', KEYS[5], 0, tonumber(ARGV[4]) - 1)
+        -- Numbers returned by scripts are truncated to integers
+        return {payload, tostring(wait)}
+    end
+
+    -- The user's turn is over, it keeps the rest of its deficit for its next turn
+    redis.call('RPUSH', KEYS[1], redis.call('LPOP', KEYS[1]))
+    user = start_turn()
+end
+return nil
+"""
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class JobScheduler:
+    """
+    Queues of the quiz generation jobs waiting for a worker, shared by every web and worker node
+    through Redis. Jobs are routed to a class by their estimated cost, and within a class each
+    user gets a fair share of the workers (deficit round-robin over the users), so a user who
+    queues many large jobs does not delay the jobs of the other users.
+
+    The Celery queue of a class only holds one interchangeable message per queued job: the worker
+    receiving a message runs the job the scheduler picks at that moment, so the order of the jobs
+    is decided when a worker is free, not when the jobs are queued.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        class_max_costs: Tuple[int, int],
+        quantum: int,
+        prefix: str = "quizgpt:scheduler",
+    ) -> None:
+        self.redis = redis
+        # Maximum cost of the small and medium jobs, the more expensive jobs are large
+        self.class_max_costs = class_max_costs
+        self.quantum = quantum
+        self.prefix = prefix
+        self._push = redis.register_script(PUSH_SCRIPT)
+        self._pop = redis.register_script(POP_SCRIPT)
+
+    def queue_class(self, cost: int) -> str:
+        """
+        Class of a job of the given estimated cost
+        """
+        for queue_class, max_cost in zip(QUEUE_CLASSES, self.class_max_costs):
+            if cost <= max_cost:
+                return queue_class
+        return QUEUE_CLASSES[-1]
+
+    def _key(self, queue_class: str, name: str) -> str:
+        return f"{self.prefix}:{queue_class}:{name}"
+
+    def push(
+        self, queue_class: str, user_id: int, job_id: str, cost: int, payload: dict
+    ) -> None:
+        """
+        Queues a job of the user, `payload` is returned by `pop` when it is the job's turn
+        """
+        self._push(
+            keys=[
+                self._key(queue_class, "round"),
+                self._key(queue_class, "deficits"),
+                self._key(queue_class, f"users:{user_id}"),
+                self._key(queue_class, "payloads"),
+                self._key(queue_class, "pending"),
+            ],
+            args=[
+                user_id,
+                job_id,
+                cost,
+                time.time(),
+                json.dumps(payload),
+                self.quantum,
+            ],
+        )
+
+    def pop(self, queue_class: str) -> Optional[Tuple[dict, float]]:
+        """
+        Removes the next job to run from the class' queues, returns its payload and the seconds
+        it waited. Returns `None` if no job is queued.
+        """
+        job = self._pop(
+            keys=[
+                self._key(queue_class, "round"),
+                self._key(queue_class, "deficits"),
+                self._key(queue_class, "payloads"),
+                self._key(queue_class, "pending"),
+                self._key(queue_class, "waits"),
+            ],
+            args=[
+                self._key(queue_class, "users:"),
+                self.quantum,
+                time.time(),
+                MAX_WAIT_SAMPLES,
+            ],
+        )
+        if job is None:
+            return None
+        payload, wait = job
+        return json.loads(payload), float(wait)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of queued jobs and users of each class, and the times the class' last
+        jobs waited before a worker started them
+        """
+        with self.redis.pipeline(transaction=False) as pipe:
+            for queue_class in QUEUE_CLASSES:
+                pipe.get(self._key(queue_class, "pending"))
+                pipe.llen(self._key(queue_class, "round"))
+                pipe.lrange(self._key(queue_class, "waits"), 0, -1)
+            results = pipe.execute()
+
+        stats = {}
+        for i, queue_class in enumerate(QUEUE_CLASSES):
+            pending, users, waits = results[i * 3 : i * 3 + 3]
+            waits = [float(wait) for wait in waits]
+            stats[queue_class] = {
+                "queued_jobs": int(pending or 0),
+                "queued_users": users,
+                "wait": {
+                    "samples": len(waits),
+                    "mean": statistics.mean(waits) if waits else None,
+                    "median": statistics.median(waits) if waits else None,
+                    "p90": percentile(waits, 90),
+                    "p99": percentile(waits, 99),
+                    "max": max(waits, default=None),
+                },
+            }
+        return stats
@@ -0,0 +1,103 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    column,
+    func,
+    literal_column,
+    or_,
+    table,
+    text,
+)
+from app import db
+
+# Searched columns of each searchable table, the first one weighs the most in the relevance.
+# Their search indexes are created by the `add_full_text_search` migration: a generated
+# `search_vector` column with a GIN index on PostgreSQL, a `<table>_search` FTS5 table kept up to
+# date by triggers on SQLite.
+SEARCHED_COLUMNS: Dict[str, List[str]] = {
+    "subject": ["title"],
+    "quiz": ["title", "description"],
+}
+
+# FTS5 tables of the SQLite database, read once per process
+_sqlite_search_tables: Optional[Set[str]] = None
+
+
+def search_terms(search_query: str) -> List[str]:
+    """
+    Words of a search query, every other character is ignored
+    """
+    return re.findall(r"\w+", search_query)
+
+
+def _has_sqlite_search_table(name: str) -> bool:
+    global _sqlite_search_tables
+    if _sqlite_search_tables is None:
+        _sqlite_search_tables = set(
+            db.session.execute(
+                text("SELECT name FROM sqlite_master WHERE sql LIKE '%USING fts5%'")
+            ).scalars()
+        )
+    return name in _sqlite_search_tables
+
+
+def search(
+    query: Select, model, search_query: str
+) -> Tuple[Select, Optional[ColumnElement]]:
+    """
+    Restricts a query of the model's rows to the rows matching every word of the search query,
+    words matching the beginning of longer words too (so the results update as the user types).
+    Returns the query and the relevance of its rows, to order them by.
+
+    Uses the model's full-text search index, so the search does not read the whole table. On a
+    database without the index (e.g. a SQLite database created without the migrations), falls
+    back to a `LIKE` scan without relevance.
+    """
+    terms = search_terms(search_query)
+    if not terms:
+        return query, None
+
+    table_name = model.__tablename__
+    searched_columns = SEARCHED_COLUMNS[table_name]
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        # Words are not stemmed ('simple' configuration), quizzes are in any language
+        tsquery = func.to_tsquery(
+            "simple", " & ".join(f"{term}:*" for term in terms)
+        )
+        search_vector = literal_column(f"{table_name}.search_vector")
+        return (
+            query.where(search_vector.op("@@")(tsquery)),
+            func.ts_rank(search_vector, tsquery),
+        )
+
+    search_table = f"{table_name}_search"
+    if dialect == "sqlite" and _has_sqlite_search_table(search_table):
+        fts_query = " ".join(f'"{term}"*' for term in terms)
+        # The first column weighs 10 times more than the others, lower BM25 is more relevant
+        weights = ", ".join(["10.0"] + ["1.0"] * (len(searched_columns) - 1))
+        fts_table = table(search_table, column("rowid"))
+        return (
+            query.join(fts_table, fts_table.c.rowid == model.id).where(
+                literal_column(search_table).op("MATCH")(fts_query)
+            ),
+            -literal_column(f"bm25({search_table}, {weights})"),
+        )
+
+    return (
+        query.where(
+            *(
+                or_(
+                    *(
+                        getattr(model, name).ilike(f"%{term}%")
+                        for name in searched_columns
+                    )
+                )
+                for term in terms
+            )
+        ),
+        None,
+    )
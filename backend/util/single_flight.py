@@ -0,0 +1,187 @@
+import json
+import hashlib
+from typing import List, Optional, Tuple
+from redis import Redis
+
+# Celery state of a follower's job until it gets its result, its result is `{"flight": key}`
+FOLLOWING_STATE = "FOLLOWING"
+
+# Makes the job the flight's leader if no job of the flight is in flight. Otherwise returns the
+# leader's job id: a request identical to the leader's request is attached to the leader's job,
+# any other request is added to the flight's followers.
+#
+# KEYS: leader job id, leader request, followers
+# ARGV: job id, request, seconds the flight may last before its job starts
+JOIN_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[3]) then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    redis.call('DEL', KEYS[3])
+    return {false, 0}
+end
+
+local leader = redis.call('GET', KEYS[1])
+if redis.call('GET', KEYS[2]) == ARGV[2] then
+    return {leader, 1}
+end
+redis.call('RPUSH', KEYS[3], ARGV[1] .. ':' .. ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return {leader, 0}
+"""
+
+# Renews the flight of the leader's job once the job starts, for the time the job may run
+#
+# KEYS: leader job id, leader request, followers
+# ARGV: job id, seconds the flight may last from now on
+START_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+for i = 1, #KEYS do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+return 1
+"""
+
+# Ends the flight of the leader's job, and remembers its result if it has one. Returns the
+# followers, who joined the flight while it was in flight.
+#
+# KEYS: leader job id, leader request, followers, result
+# ARGV: job id, result (empty if the job failed or made no quiz), seconds the result is
+# remembered
+LAND_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return {}
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+if ARGV[2] ~= '' then
+    redis.call('SET', KEYS[4], ARGV[2], 'EX', ARGV[3])
+end
+local followers = redis.call('LRANGE', KEYS[3], 0, -1)
+redis.call('DEL', KEYS[3])
+return followers
+"""
+
+
+def flight_key(
+    blob_names: List[str],
+    number_of_questions: int,
+    language: Optional[str],
+    prompt_version: str,
+) -> str:
+    """
+    Key of the quiz generation requests generating the same questions: the same files (whose blob
+    names are their content hashes), number of questions, language and prompts
+    """
+    return hashlib.sha256(
+        json.dumps(
+            [sorted(blob_names), number_of_questions, language, prompt_version]
+        ).encode()
+    ).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces the quiz generation requests of the same flight (see `flight_key`), shared by every
+    web and worker node through Redis. Only the first request (the leader) generates questions,
+    the requests made while it is in flight follow it and get a copy of its quiz once it lands.
+    The result of the last landed flight is remembered, so the later requests can copy its quiz
+    right away.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        max_flight_duration: int,
+        ttl: int,
+        max_queue_duration: Optional[int] = None,
+        prefix: str = "quizgpt:flights",
+    ) -> None:
+        self.redis = redis
+        # Seconds after which a flight whose job started but never landed (e.g. its worker was
+        # killed) is ended
+        self.max_flight_duration = max_flight_duration
+        # Seconds after which a flight whose job never started is ended, a queued job is not lost
+        # so it may wait longer than it may run
+        self.max_queue_duration = max_queue_duration or max_flight_duration
+        # Seconds the result of a landed flight is remembered
+        self.ttl = ttl
+        self.prefix = prefix
+        self._join = redis.register_script(JOIN_SCRIPT)
+        self._start = redis.register_script(START_SCRIPT)
+        self._land = redis.register_script(LAND_SCRIPT)
+
+    def _keys(self, key: str) -> List[str]:
+        return [
+            f"{self.prefix}:{key}:leader",
+            f"{self.prefix}:{key}:request",
+            f"{self.prefix}:{key}:followers",
+            f"{self.prefix}:{key}:result",
+        ]
+
+    def join(
+        self, key: str, job_id: str, request: dict
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Joins the flight with the job of the request. Returns the id of the flight's leader job
+        (`None` if the job is the leader) and whether the request is identical to the leader's
+        request, in which case the leader's job is the request's job.
+        """
+        leader, attached = self._join(
+            keys=self._keys(key)[:3],
+            args=[
+                job_id,
+                json.dumps(request, sort_keys=True),
+                self.max_queue_duration,
+            ],
+        )
+        return (leader.decode() if leader else None), bool(attached)
+
+    def start(self, key: str, job_id: str) -> bool:
+        """
+        Renews the flight of the leader's job when the job starts, it lasts `max_flight_duration`
+        seconds from then on. Returns `False` if the job is not the flight's leader anymore.
+        """
+        return bool(
+            self._start(
+                keys=self._keys(key)[:3], args=[job_id, self.max_flight_duration]
+            )
+        )
+
+    def leader(self, key: str) -> Optional[str]:
+        """
+        Returns the id of the flight's leader job, `None` if no job of the flight is in flight
+        """
+        leader = self.redis.get(self._keys(key)[0])
+        return leader.decode() if leader else None
+
+    def land(
+        self, key: str, job_id: str, result: Optional[dict]
+    ) -> List[Tuple[str, dict]]:
+        """
+        Ends the flight of the leader's job, whose result is `result` (`None` if the job failed or
+        made no quiz, which is not remembered).
+        Returns the job id and request of each follower.
+        """
+        followers = self._land(
+            keys=self._keys(key),
+            args=[job_id, "" if result is None else json.dumps(result), self.ttl],
+        )
+        return [
+            (follower_id, json.loads(request))
+            for follower_id, request in (
+                follower.decode().split(":", 1) for follower in followers
+            )
+        ]
+
+    def landed_result(self, key: str) -> Optional[dict]:
+        """
+        Returns the result of the flight's last landed leader, if it is still remembered
+        """
+        result = self.redis.get(self._keys(key)[3])
+        return json.loads(result) if result else None
+
+    def forget(self, key: str) -> None:
+        """
+        Forgets the result of the flight's last landed leader, e.g. once its quiz was deleted
+        """
+        self.redis.delete(self._keys(key)[3])
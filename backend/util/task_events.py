@@ -0,0 +1,269 @@
+import json
+import time
+import hashlib
+import logging
+from contextlib import ExitStack, contextmanager
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+from celery import states
+from app import celery_app
+from util.single_flight import FOLLOWING_STATE
+import tasks
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two comments sent on an idle event stream, so proxies do not close it and
+# disconnected clients are noticed
+HEARTBEAT_INTERVAL = 15
+# Seconds an event stream stays open, the browser reconnects to it once it is closed
+MAX_STREAM_DURATION = 10 * 60
+# Maximum number of seconds a long poll request waits for the task's state to change
+MAX_LONG_POLL_WAIT = 30
+# Seconds the listener waits before reconnecting after an error, doubled after every failed
+# attempt up to the maximum
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+
+
+def task_status(meta: dict) -> dict:
+    """
+    Returns the status of a task as sent to the clients, from the task's result backend meta
+    """
+    state = meta["status"]
+    status = {
+        "state": state,
+        "ready": state in states.READY_STATES,
+        "successful": state == states.SUCCESS,
+        "value": None,
+    }
+    if state == states.SUCCESS:
+        status["value"] = meta["result"]
+    elif state in states.PROPAGATE_STATES:
+        status["value"] = {"message": str(meta["result"])}
+
+    if state == "PROGRESS":
+        status["progress"] = meta["result"]
+
+    # Lets long polling clients tell the server which status they already have
+    status["version"] = hashlib.sha1(
+        json.dumps(status, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+    return status
+
+
+def follower_status(leader_meta: Optional[dict]) -> dict:
+    """
+    Returns the status of a follower's job waiting for the job of its flight's leader, from the
+    leader's result backend meta: the leader's progress, without the leader's quiz
+    """
+    if leader_meta is None or leader_meta["status"] != "PROGRESS":
+        # Queued, or done and the follower's own result is about to be stored
+        return task_status({"status": states.PENDING, "result": None})
+
+    progress = {k: v for k, v in leader_meta["result"].items() if k != "quiz_id"}
+    return task_status({"status": "PROGRESS", "result": progress})
+
+
+def read_task_status(task_id: str) -> Tuple[dict, Optional[str]]:
+    """
+    Returns the current status of a task, and the id of the leader job it follows if it is a
+    follower's job (see `tasks.submit_quiz_job`)
+    """
+    meta = celery_app.backend.get_task_meta(task_id)
+    if meta["status"] != FOLLOWING_STATE:
+        return task_status(meta), None
+
+    leader_id = tasks.flights.leader(meta["result"]["flight"])
+    if leader_id is None or leader_id == task_id:
+        return follower_status(None), None
+    return follower_status(celery_app.backend.get_task_meta(leader_id)), leader_id
+
+
+def get_task_status(task_id: str) -> dict:
+    """
+    Returns the current status of a task, read from the result backend with a single request (two
+    for a follower's job)
+    """
+    return read_task_status(task_id)[0]
+
+
+class TaskEventListener:
+    """
+    Listens to the task state updates the Redis result backend publishes, and hands them to the
+    requests waiting for the updates of the task. A single Redis connection is used by the whole
+    process, however many requests are waiting.
+    """
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+        self._waiters: Dict[str, Set[Queue]] = {}
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+
+    @contextmanager
+    def subscribe(
+        self, task_id: str, updates: Optional[Queue] = None
+    ) -> Iterator[Queue]:
+        """
+        Returns a queue receiving the task's result backend meta every time its state is updated.
+        `None` is received when updates may have been missed, the task's state must be read again.
+        A queue can receive the updates of several tasks, by passing it as `updates`.
+        """
+        updates = updates or Queue()
+        with self._lock:
+            self._waiters.setdefault(task_id, set()).add(updates)
+            if self._thread is None:
+                self._thread = Thread(target=self._listen, daemon=True)
+                self._thread.start()
+        try:
+            yield updates
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(task_id)
+                waiters.discard(updates)
+                if not waiters:
+                    del self._waiters[task_id]
+
+    def _listen(self) -> None:
+        # Every task's meta key is also the channel its updates are published to
+        pattern = self.backend.get_key_for_task("*")
+        prefix_length = len(pattern) - 1
+        delay = MIN_RECONNECT_DELAY
+        # The thread must never die, the waiting requests would only get timeouts from then on
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.backend.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(pattern)
+                delay = MIN_RECONNECT_DELAY
+                for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message, prefix_length)
+            except Exception:
+                logger.exception("Task event listener disconnected, reconnecting")
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+            # Updates published while disconnected are lost
+            with self._lock:
+                waiters = [q for qs in self._waiters.values() for q in qs]
+            for updates in waiters:
+                updates.put(None)
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _dispatch(self, message: dict, prefix_length: int) -> None:
+        """
+        Hands a published update to the requests waiting for it. An update that cannot be read is
+        skipped, its waiters read the task's state again instead.
+        """
+        try:
+            task_id = message["channel"][prefix_length:].decode()
+        except Exception:
+            logger.exception("Invalid task event channel %r", message["channel"])
+            return
+
+        with self._lock:
+            waiters = list(self._waiters.get(task_id, ()))
+        if not waiters:
+            return
+
+        try:
+            meta = self.backend.decode_result(message["data"])
+        except Exception:
+            logger.exception("Invalid task event of task %s", task_id)
+            meta = None
+        for updates in waiters:
+            updates.put(meta)
+
+
+listener = TaskEventListener(celery_app.backend)
+
+
+@contextmanager
+def watch_task(task_id: str) -> Iterator[Tuple[Queue, Callable[[], dict]]]:
+    """
+    Subscribes to the updates of the task, and to those of the leader job it follows if it is a
+    follower's job. Returns the queue of the updates, and a function reading the task's current
+    status (which subscribes to the updates of the leader the task follows from then on).
+    """
+    with ExitStack() as stack:
+        updates = stack.enter_context(listener.subscribe(task_id))
+        followed = set()
+
+        def read_status() -> dict:
+            status, leader_id = read_task_status(task_id)
+            # A follower follows another leader once its leader failed
+            if leader_id is not None and leader_id not in followed:
+                followed.add(leader_id)
+                stack.enter_context(listener.subscribe(leader_id, updates))
+            return status
+
+        yield updates, read_status
+
+
+def _next_status(
+    task_id: str, updates: Queue, read_status: Callable[[], dict], timeout: float
+) -> Optional[dict]:
+    """
+    Waits up to `timeout` seconds for the next update of the task, returns its status or `None`
+    if the task was not updated
+    """
+    try:
+        meta = updates.get(timeout=timeout)
+    except Empty:
+        return None
+    # An update of the leader the task follows is read as the task's status
+    if (
+        meta is None
+        or meta.get("task_id") != task_id
+        or meta["status"] == FOLLOWING_STATE
+    ):
+        return read_status()
+    return task_status(meta)
+
+
+def wait_for_task_status(task_id: str, version: Optional[str], timeout: float) -> dict:
+    """
+    Returns the status of the task as soon as its version is not `version` anymore, or its
+    current status after `timeout` seconds
+    """
+    with watch_task(task_id) as (updates, read_status):
+        # Subscribed before reading the status, so an update made in between is not missed
+        status = read_status()
+        deadline = time.monotonic() + timeout
+        while status["version"] == version and not status["ready"]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Read again once the wait is over, in case an update was lost
+            status = (
+                _next_status(task_id, updates, read_status, remaining) or read_status()
+            )
+        return status
+
+
+def stream_task_status(task_id: str) -> Iterator[str]:
+    """
+    Server-sent events of the task's status, an event is sent every time the status changes
+    until the task is ready
+    """
+    with watch_task(task_id) as (updates, read_status):
+        status = read_status()
+        yield f"data: {json.dumps(status, default=str)}\n\n"
+
+        deadline = time.monotonic() + MAX_STREAM_DURATION
+        while not status["ready"] and time.monotonic() < deadline:
+            new_status = _next_status(task_id, updates, read_status, HEARTBEAT_INTERVAL)
+            if new_status is None:
+                yield ": heartbeat\n\n"
+                # Read again every heartbeat, so a lost update does not leave the client waiting
+                new_status = read_status()
+            if new_status["version"] != status["version"]:
+                status = new_status
+                yield f"data: {json.dumps(status, default=str)}\n\n"
@@ -0,0 +1,60 @@
+import hashlib
+from tempfile import NamedTemporaryFile
+from typing import Optional
+from flask import Request
+
+# Start of every PDF file
+PDF_SIGNATURE = b"%PDF-"
+
+
+class HashingFile:
+    """
+    Temporary file an uploaded file is streamed to, computing the SHA-256 of its content as its
+    chunks are written. The file keeps the uploaded file's extension, so it can be parsed in place.
+    """
+
+    def __init__(self, filename: Optional[str] = None) -> None:
+        suffix = ""
+        if filename and "." in filename:
+            suffix = "." + filename.rsplit(".", 1)[1].lower()
+        self.file = NamedTemporaryFile(suffix=suffix)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+
+class UploadRequest(Request):
+    """
+    Request whose uploaded files are streamed to `HashingFile`s, never held in memory
+    """
+
+    def _get_file_stream(
+        self,
+        total_content_length,
+        content_type,
+        filename=None,
+        content_length=None,
+    ):
+        return HashingFile(filename)
+
+
+def has_pdf_signature(file) -> bool:
+    """
+    Checks the content of an uploaded file is a PDF, not only its extension
+    """
+    position = file.tell()
+    try:
+        # Some PDF writers put a few bytes before the signature, which readers accept
+        return PDF_SIGNATURE in file.read(1024)
+    finally:
+        file.seek(position)
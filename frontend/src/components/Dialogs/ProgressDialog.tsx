@@ -10,7 +10,7 @@ import {
   linearProgressClasses,
 } from "@mui/material";
 import { useTranslation } from "next-i18next";
-import { customFetch } from "@/util";
+import { customFetch, PUBLIC_API_URL } from "@/util";
 import { styled } from "@mui/system";
 
 interface CreateQuizTaskResult {
@@ -26,6 +26,7 @@ interface ProgressResponse {
   ready: boolean;
   successful: boolean;
   state: string;
+  version: string;
   progress?: {
     current: number;
     total: number;
@@ -73,33 +74,38 @@ const ProgressDialog: React.FC<ProgressDialogProps> = ({
   const [currentQuestions, setCurrentQuestions] = useState(0);
 
   useEffect(() => {
-    const fetchProgress = async () => {
-      try {
-        let timeoutId: NodeJS.Timeout | null = null;
+    if (!taskId) return;
 
-        const response = await customFetch(`/tasks/result/${taskId}`);
-        const data: ProgressResponse = await response.json();
+    let cancelled = false;
+    let eventSource: EventSource | null = null;
 
-        if (data.progress) {
-          setCurrentQuestions(data.progress.current);
-        }
+    // Returns whether the task is done
+    const handleStatus = (data: ProgressResponse) => {
+      if (data.progress) {
+        setCurrentQuestions(data.progress.current);
+      }
 
-        if (data.successful && data.value) {
-          onSuccess(data.value);
-          setCurrentQuestions(0);
-        } else if (data.ready && !data.successful && data.value) {
-          onError(data.value.message);
-          setCurrentQuestions(0);
+      if (!data.ready) return false;
 
-          if (timeoutId) clearTimeout(timeoutId);
-        }
+      if (data.successful && data.value) {
+        onSuccess(data.value);
+      } else if (!data.successful && data.value) {
+        onError(data.value.message);
+      }
+      onClose();
+      setCurrentQuestions(0);
+      return true;
+    };
 
-        if (!data.ready) {
-          timeoutId = setTimeout(fetchProgress, 1000);
-        } else {
-          onClose();
-          setCurrentQuestions(0);
-        }
+    // Fallback for when the status cannot be streamed, the server holds each request until the
+    // status is not the `version` we already have anymore
+    const longPoll = async (version?: string) => {
+      try {
+        const query = version ? `?wait=25&version=${version}` : "?wait=25";
+        const response = await customFetch(`/tasks/result/${taskId}${query}`);
+        const data: ProgressResponse = await response.json();
+
+        if (!cancelled && !handleStatus(data)) longPoll(data.version);
       } catch (error: any) {
         console.error(error);
         onError(error.message);
@@ -107,7 +113,26 @@ const ProgressDialog: React.FC<ProgressDialogProps> = ({
       }
     };
 
-    if (taskId) fetchProgress();
+    if (typeof EventSource !== "undefined") {
+      eventSource = new EventSource(`${PUBLIC_API_URL}/tasks/stream/${taskId}`);
+      eventSource.onmessage = (event) => {
+        if (handleStatus(JSON.parse(event.data))) eventSource?.close();
+      };
+      eventSource.onerror = () => {
+        // The browser reconnects by itself to streams closed by the server, only streams that
+        // could not be opened are closed
+        if (eventSource?.readyState === EventSource.CLOSED && !cancelled) {
+          longPoll();
+        }
+      };
+    } else {
+      longPoll();
+    }
+
+    return () => {
+      cancelled = true;
+      eventSource?.close();
+    };
   }, [taskId, onClose]);
 
   return (
@@ -40,7 +40,13 @@ const SavedQuizzes = () => {
   const { data: subjects } = useGetSubjects();
   const [deleteQuiz] = useDeleteQuiz();
 
-  const { data: quizzes, refetch } = useGetQuizzes({
+  const {
+    data: quizzes,
+    loading,
+    hasMore,
+    loadMore,
+    refetch,
+  } = useGetQuizzes({
     title: searchText,
     subjectId: selectedSubject.id,
   });
@@ -176,6 +182,13 @@ const SavedQuizzes = () => {
             </Grid>
           ))}
         </Grid>
+        {hasMore && (
+          <Box sx={{ display: "flex", justifyContent: "center", mt: 3 }}>
+            <Button variant="outlined" disabled={loading} onClick={loadMore}>
+              {t("common:loadMore")}
+            </Button>
+          </Box>
+        )}
       </Box>
       <ConfirmationDialog
         open={showConfirmationDialog}
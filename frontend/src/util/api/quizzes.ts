@@ -3,6 +3,44 @@ import { useCallback, useEffect, useState } from "react";
 import { GetQuizResponse } from "@/util/types";
 import { QuizQuestion } from "@/pages/quizzes/[id]/start";
 
+interface IPage<T> {
+  rows: T[];
+  nextCursor: string | null;
+}
+
+// Lists are returned in pages, the cursor of the next page is sent in the X-Next-Cursor header
+async function fetchPage<T = any>(
+  route: string,
+  cursor?: string | null
+): Promise<IPage<T>> {
+  const query = cursor
+    ? `${route}${route.includes("?") ? "&" : "?"}cursor=${encodeURIComponent(
+        cursor
+      )}`
+    : route;
+  const response = await customFetch(query);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch ${route}`);
+  }
+
+  return {
+    rows: await response.json(),
+    nextCursor: response.headers.get("X-Next-Cursor"),
+  };
+}
+
+// Every page of a short list (e.g. the user's subjects)
+async function fetchAllPages<T = any>(route: string): Promise<T[]> {
+  const rows: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const page: IPage<T> = await fetchPage<T>(route, cursor);
+    rows.push(...page.rows);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return rows;
+}
+
 interface ISubjectsApiResponse {
   data: {
     id: string;
@@ -18,15 +56,11 @@ export function useGetSubjects(title?: string): ISubjectsApiResponse {
   useEffect(() => {
     (async () => {
       try {
-        let query = "/quizzing/subjects";
+        let query = "/quizzing/subjects?limit=100";
         if (title) {
-          query += `?search_query=${title}`;
-        }
-        const response = await customFetch(query);
-        if (!response.ok) {
-          return null;
+          query += `&search_query=${title}`;
         }
-        const data = await response.json();
+        const data = await fetchAllPages(query);
 
         if (!data) {
           setError("An error occurred while fetching subjects");
@@ -51,18 +85,10 @@ export function useCreateOrGetSubject() {
   async function handleCreateOrGetSubject(
     title: string
   ): Promise<{ id: string; title: string }> {
-    const getSubjectResponse = await customFetch(
-      `/quizzing/subjects?search_query=${title}`,
-      {},
-      true
+    const getSubjectData = await fetchAllPages(
+      `/quizzing/subjects?limit=100&search_query=${title}`
     );
 
-    if (!getSubjectResponse.ok) {
-      throw new Error("Failed to fetch subjects");
-    }
-
-    const getSubjectData = await getSubjectResponse.json();
-
     if (getSubjectData.length) {
       const subject = getSubjectData.find(
         (subject: { id: string; title: string }) => subject.title === title
@@ -114,12 +140,17 @@ export function useGetQuizzes(initialVariables?: {
   }[];
   error: null | string;
   loading: boolean;
+  hasMore: boolean;
+  loadMore: () => void;
   refetch: (variables?: { title?: string; subjectId?: string }) => void;
 } {
-  const [data, setData] = useState([]);
+  const [data, setData] = useState<any[]>([]);
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(false);
   const [variables, setVariables] = useState(initialVariables);
+  // Query of the fetched pages, and the cursor of the next page (null on the last page)
+  const [query, setQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   const fetchQuizzes = useCallback(
     async (fetchVariables?: { title?: string; subjectId?: string }) => {
@@ -138,14 +169,10 @@ export function useGetQuizzes(initialVariables?: {
           query += `?search_query=${vars.title}&subject_id=${vars.subjectId}`;
         }
 
-        const response = await customFetch(query);
-
-        if (!response.ok) {
-          throw new Error("Failed to fetch quizzes");
-        }
-
-        const data = await response.json();
-        setData(data);
+        const page = await fetchPage(query);
+        setData(page.rows);
+        setQuery(query);
+        setNextCursor(page.nextCursor);
       } catch (error: any) {
         setError(error.message);
       } finally {
@@ -155,6 +182,20 @@ export function useGetQuizzes(initialVariables?: {
     []
   );
 
+  const loadMore = async () => {
+    if (!nextCursor || loading) return;
+    setLoading(true);
+    try {
+      const page = await fetchPage(query, nextCursor);
+      setData((rows) => [...rows, ...page.rows]);
+      setNextCursor(page.nextCursor);
+    } catch (error: any) {
+      setError(error.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   useEffect(() => {
     fetchQuizzes();
   }, [fetchQuizzes]);
@@ -164,7 +205,14 @@ export function useGetQuizzes(initialVariables?: {
     fetchQuizzes(newVariables);
   };
 
-  return { data, error, loading, refetch };
+  return {
+    data,
+    error,
+    loading,
+    hasMore: nextCursor !== null,
+    loadMore,
+    refetch,
+  };
 }
 
 interface ICreateQuizParams {